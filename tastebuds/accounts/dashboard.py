@@ -0,0 +1,144 @@
+"""Queries behind the admin dashboard.
+
+The headline counts come from one conditional-aggregate query and are
+cached for ADMIN_STATS_CACHE_TTL seconds; the user tables are filtered,
+sorted and paginated in the database. Bulk (de)activation is a single
+UPDATE and the CSV export streams rows straight from a cursor.
+``ensure_user_indexes`` adds the indexes those queries rely on to
+``auth_user`` after ``migrate``.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Rating, SavedRecipe, WeeklyMealPlan
+
+STATS_CACHE_KEY = 'accounts:user_stats'
+
+# status -> filter of the user table
+STATUS_FILTERS = {
+    'active': Q(is_active=True),
+    'inactive': Q(is_active=False),
+    'all': Q(),
+}
+
+SORT_FIELDS = ('username', 'email', 'date_joined', 'last_login')
+DEFAULT_SORT = '-date_joined'
+
+USER_INDEXES = [
+    models.Index(fields=['is_active', 'date_joined'], name='auth_user_active_joined_idx'),
+    models.Index(fields=['date_joined'], name='auth_user_joined_idx'),
+]
+
+
+def user_stats():
+    """Return the user counts, computed in a single query and cached briefly."""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = User.objects.aggregate(
+            total_users=Count('id'),
+            active_count=Count('id', filter=Q(is_active=True)),
+            inactive_count=Count('id', filter=Q(is_active=False)),
+            staff_count=Count('id', filter=Q(is_staff=True)),
+            superuser_count=Count('id', filter=Q(is_superuser=True)),
+        )
+        cache.set(STATS_CACHE_KEY, stats, settings.ADMIN_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_user_stats():
+    cache.delete(STATS_CACHE_KEY)
+
+
+def clean_sort(sort):
+    """Return sort if it names a sortable column (optionally with '-')."""
+    return sort if sort and sort.lstrip('-') in SORT_FIELDS else DEFAULT_SORT
+
+
+def filter_users(status='active', search=''):
+    """Return the users with the given status, optionally filtered by a
+    username/email search."""
+    users = User.objects.filter(STATUS_FILTERS.get(status, STATUS_FILTERS['active']))
+    if search:
+        users = users.filter(Q(username__icontains=search) | Q(email__icontains=search))
+    return users
+
+
+def user_page(status='active', search='', sort=DEFAULT_SORT, page=1):
+    """Return one page of ``filter_users(status, search)``."""
+    sort = clean_sort(sort)
+    users = filter_users(status, search).order_by(sort, '-id' if sort.startswith('-') else 'id').only(
+        'id', 'username', 'email', 'date_joined', 'last_login', 'is_active', 'is_staff', 'is_superuser',
+    )
+    return Paginator(users, settings.ADMIN_USERS_PAGE_SIZE).get_page(page)
+
+
+def set_active(actor, users, active):
+    """Set ``is_active`` on a queryset of users with one UPDATE.
+
+    The acting user is never changed, and only superusers may deactivate
+    superusers. Returns the number of accounts that changed.
+    """
+    users = users.exclude(id=actor.id).exclude(is_active=active)
+    if not active and not actor.is_superuser:
+        users = users.exclude(is_superuser=True)
+    changed = users.update(is_active=active)
+    if changed:
+        invalidate_user_stats()
+    return changed
+
+
+def _count(model):
+    """Subquery counting a user's rows of model."""
+    return Subquery(
+        model.objects.filter(user=OuterRef('pk')).order_by()
+        .values('user').annotate(count=Count('id')).values('count'),
+        output_field=models.IntegerField(),
+    )
+
+
+EXPORT_HEADER = [
+    'id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser',
+    'date_joined', 'last_login', 'ratings', 'saved_recipes', 'meal_plans',
+]
+
+
+def export_rows(users, chunk_size=2000):
+    """Yield the CSV rows (header first) of a queryset of users with their
+    activity counts, reading the users in chunks from a server-side cursor."""
+    yield EXPORT_HEADER
+    users = users.order_by('id').annotate(
+        rating_count=Coalesce(_count(Rating), 0),
+        saved_count=Coalesce(_count(SavedRecipe), 0),
+        plan_count=Coalesce(_count(WeeklyMealPlan), 0),
+    ).values_list(
+        'id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser',
+        'date_joined', 'last_login', 'rating_count', 'saved_count', 'plan_count',
+    )
+    for row in users.iterator(chunk_size=chunk_size):
+        row = list(row)
+        row[6] = row[6].isoformat()
+        row[7] = row[7].isoformat() if row[7] else ''
+        yield row
+
+
+def ensure_user_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Add USER_INDEXES to the auth_user table if they are missing.
+
+    ``auth.User`` is not ours to add ``Meta.indexes`` to, so this runs as a
+    ``post_migrate`` receiver instead.
+    """
+    connection = connections[using]
+    table = User._meta.db_table
+    if table not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, table)
+    with connection.schema_editor() as schema_editor:
+        for index in USER_INDEXES:
+            if index.name not in existing:
+                schema_editor.add_index(User, index)
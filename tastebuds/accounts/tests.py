@@ -1,3 +1,106 @@
+import csv
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+
+class AdminUsersTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = User.objects.create_superuser('root', 'root@example.com', 'secret')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'secret', is_staff=True)
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        cls.bob = User.objects.create_user('bob', 'bob@example.org', 'secret')
+        cls.carol = User.objects.create_user('carol', 'carol@example.com', 'secret', is_active=False)
+
+    def active(self, *users):
+        return [User.objects.get(id=user.id).is_active for user in users]
+
+
+class BulkSetActiveTests(AdminUsersTestCase):
+    """Bulk (de)activation from the admin dashboard."""
+
+    url = reverse('accounts.bulk_set_active')
+
+    def test_checked_users(self):
+        self.client.login(username='staff', password='secret')
+        response = self.client.post(self.url, {'action': 'deactivate', 'user_ids': [self.alice.id, self.bob.id]})
+        self.assertRedirects(response, reverse('accounts.admin_dashboard') + '?status=active')
+        self.assertEqual(self.active(self.alice, self.bob), [False, False])
+
+    def test_not_yourself(self):
+        self.client.login(username='staff', password='secret')
+        self.client.post(self.url, {'action': 'deactivate', 'user_ids': [self.staff.id, self.alice.id]})
+        self.assertEqual(self.active(self.staff, self.alice), [True, False])
+
+    def test_superusers_only_by_superusers(self):
+        self.client.login(username='staff', password='secret')
+        self.client.post(self.url, {'action': 'deactivate', 'user_ids': [self.root.id]})
+        self.assertEqual(self.active(self.root), [True])
+
+        other_root = User.objects.create_superuser('root2', 'root2@example.com', 'secret')
+        self.client.login(username='root', password='secret')
+        self.client.post(self.url, {'action': 'deactivate', 'user_ids': [other_root.id]})
+        self.assertEqual(self.active(other_root), [False])
+
+    def test_filter_scope(self):
+        self.client.login(username='root', password='secret')
+        # Every active user matching the search but the acting one; not bob
+        # (no match) although checked
+        self.client.post(self.url, {'action': 'deactivate', 'scope': 'filter', 'status': 'active',
+                                    'q': 'example.com', 'user_ids': [self.bob.id]})
+        self.assertEqual(self.active(self.alice, self.bob, self.staff, self.root), [False, True, False, True])
+
+        self.client.post(self.url, {'action': 'activate', 'scope': 'filter', 'status': 'inactive', 'q': 'carol'})
+        self.assertEqual(self.active(self.alice, self.carol), [False, True])
+
+    def test_unknown_action(self):
+        self.client.login(username='root', password='secret')
+        self.client.post(self.url, {'action': 'delete', 'user_ids': [self.alice.id]})
+        self.assertEqual(self.active(self.alice), [True])
+
+    def test_non_staff_denied(self):
+        self.client.login(username='alice', password='secret')
+        response = self.client.post(self.url, {'action': 'deactivate', 'user_ids': [self.bob.id]})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.active(self.bob), [True])
+
+    def test_get_not_allowed(self):
+        self.client.login(username='root', password='secret')
+        response = self.client.get(self.url, {'action': 'deactivate', 'user_ids': [self.bob.id]})
+        self.assertEqual(response.status_code, 405)
+
+
+class ExportUsersTests(AdminUsersTestCase):
+    """The streamed CSV export of the dashboard's filtered users."""
+
+    url = reverse('accounts.export_users')
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_filtered_rows(self):
+        self.client.login(username='staff', password='secret')
+        rows = self.export(status='active', q='example.com')
+        self.assertEqual(rows[0][:2], ['id', 'username'])
+        self.assertEqual([row[1] for row in rows[1:]], ['root', 'staff', 'alice'])
+
+        rows = self.export(status='inactive')
+        self.assertEqual([row[1] for row in rows[1:]], ['carol'])
+
+    def test_all_by_default(self):
+        self.client.login(username='staff', password='secret')
+        self.assertEqual(len(self.export()), 1 + User.objects.count())
+
+    def test_non_staff_denied(self):
+        self.client.login(username='alice', password='secret')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
 
-# Create your tests here.
+    def test_anonymous_redirected_to_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
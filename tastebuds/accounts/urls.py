@@ -7,4 +7,6 @@ urlpatterns = [
     path('admin/dashboard/', views.admin_dashboard, name='accounts.admin_dashboard'),
     path('admin/user/<int:user_id>/deactivate/', views.deactivate_user, name='accounts.deactivate_user'),
     path('admin/user/<int:user_id>/reactivate/', views.reactivate_user, name='accounts.reactivate_user'),
+    path('admin/users/bulk/', views.bulk_set_active, name='accounts.bulk_set_active'),
+    path('admin/users/export.csv', views.export_users, name='accounts.export_users'),
 ]
\ No newline at end of file
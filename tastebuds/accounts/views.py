@@ -1,11 +1,18 @@
+import csv
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import login as auth_login, authenticate, logout as auth_logout
 from django.contrib.auth.models import User
 from .forms import CustomUserCreationForm, CustomErrorList
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
+from django.utils.http import urlencode
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from .dashboard import (SORT_FIELDS, STATUS_FILTERS, clean_sort, export_rows, filter_users,
+                        invalidate_user_stats, set_active, user_page, user_stats)
 @login_required
 def logout(request):
     auth_logout(request)
@@ -56,26 +63,33 @@ def admin_dashboard(request):
     template_data = {}
     template_data['title'] = 'Admin Dashboard'
     
-    # Get all users (active and inactive)
-    all_users = User.objects.all().order_by('-date_joined')
-    active_users = User.objects.filter(is_active=True).order_by('-date_joined')
-    inactive_users = User.objects.filter(is_active=False).order_by('-date_joined')
-    
-    # Calculate statistics
-    total_users = User.objects.count()
-    active_count = active_users.count()
-    inactive_count = inactive_users.count()
-    staff_count = User.objects.filter(is_staff=True).count()
-    superuser_count = User.objects.filter(is_superuser=True).count()
-    
-    template_data['all_users'] = all_users
-    template_data['active_users'] = active_users
-    template_data['inactive_users'] = inactive_users
-    template_data['total_users'] = total_users
-    template_data['active_count'] = active_count
-    template_data['inactive_count'] = inactive_count
-    template_data['staff_count'] = staff_count
-    template_data['superuser_count'] = superuser_count
+    # Statistics (one aggregate query, cached briefly)
+    template_data.update(user_stats())
+    
+    # One page of one table at a time: active, inactive or all users
+    status = request.GET.get('status', 'active')
+    if status not in STATUS_FILTERS:
+        status = 'active'
+    search = request.GET.get('q', '').strip()
+    sort = clean_sort(request.GET.get('sort'))
+    template_data['users_page'] = user_page(status, search, sort, request.GET.get('page'))
+    template_data['status'] = status
+    template_data['search'] = search
+    template_data['sort'] = sort
+    
+    # Links keep the other parameters of the current view
+    def query(**params):
+        current = {'status': status, 'q': search, 'sort': sort}
+        current.update(params)
+        return '?' + urlencode({key: value for key, value in current.items() if value})
+    
+    template_data['status_links'] = {name: query(status=name, page=None) for name in STATUS_FILTERS}
+    template_data['sort_links'] = {
+        field: query(sort=field if sort != field else '-' + field, page=None)
+        for field in SORT_FIELDS
+    }
+    template_data['page_query'] = query(page=None)
+    template_data['export_query'] = query(sort=None, page=None)
     
     return render(request, 'accounts/admin_dashboard.html',
                   {'template_data': template_data})
@@ -101,6 +115,7 @@ def deactivate_user(request, user_id):
     
     user_to_deactivate.is_active = False
     user_to_deactivate.save()
+    invalidate_user_stats()
     messages.success(request, f'User "{user_to_deactivate.username}" has been deactivated successfully.')
     
     return redirect('accounts.admin_dashboard')
@@ -116,6 +131,63 @@ def reactivate_user(request, user_id):
     
     user_to_reactivate.is_active = True
     user_to_reactivate.save()
+    invalidate_user_stats()
     messages.success(request, f'User "{user_to_reactivate.username}" has been reactivated successfully.')
     
-    return redirect('accounts.admin_dashboard')
\ No newline at end of file
+    return redirect('accounts.admin_dashboard')
+
+
+@login_required
+@require_POST
+def bulk_set_active(request):
+    """Activate or deactivate many users with a single UPDATE.
+
+    Applies to the checked ``user_ids``, or with ``scope=filter`` to every
+    user matching the dashboard's current status/search filter.
+    """
+    if not (request.user.is_staff or request.user.is_superuser):
+        raise PermissionDenied("You do not have permission to perform this action.")
+    
+    action = request.POST.get('action')
+    if action not in ('activate', 'deactivate'):
+        messages.error(request, 'Unknown bulk action.')
+        return redirect('accounts.admin_dashboard')
+    
+    status = request.POST.get('status', 'active')
+    search = request.POST.get('q', '').strip()
+    if request.POST.get('scope') == 'filter':
+        users = filter_users(status, search)
+    else:
+        user_ids = [i for i in request.POST.getlist('user_ids') if i.isdigit()]
+        users = User.objects.filter(id__in=user_ids)
+    
+    changed = set_active(request.user, users, action == 'activate')
+    messages.success(request, f'{changed} user(s) {action}d.')
+    
+    query = urlencode({key: value for key, value in
+                       {'status': status, 'q': search, 'sort': request.POST.get('sort')}.items() if value})
+    return redirect(reverse('accounts.admin_dashboard') + ('?' + query if query else ''))
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+def export_users(request):
+    """Stream the users matching the dashboard filter as CSV, with their
+    rating, saved recipe and meal plan counts."""
+    if not (request.user.is_staff or request.user.is_superuser):
+        raise PermissionDenied("You do not have permission to access this page.")
+    
+    users = filter_users(request.GET.get('status', 'all'), request.GET.get('q', '').strip())
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in export_rows(users)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = 'attachment; filename="users.csv"'
+    return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Rating, SavedRecipe, WeeklyMealPlan, ShoppingItem
+from .models import Rating, RatingSummary, SavedIngredientCount, SavedRecipe, SavedRecipeIngredient, WeeklyMealPlan, ShoppingItem, Meal, MealCategory, MealArea
 
 
 @admin.register(Rating)
@@ -10,12 +10,31 @@ class RatingAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(RatingSummary)
+class RatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ('recipe_id', 'count', 'average', 'updated_at')
+    search_fields = ('recipe_id',)
+    readonly_fields = ('updated_at',)
+
+
+class SavedRecipeIngredientInline(admin.TabularInline):
+    model = SavedRecipeIngredient
+    extra = 0
+
+
 @admin.register(SavedRecipe)
 class SavedRecipeAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe_name', 'recipe_id', 'created_at')
-    list_filter = ('created_at',)
+    list_display = ('user', 'recipe_name', 'recipe_id', 'ingredients_synced', 'created_at')
+    list_filter = ('ingredients_synced', 'created_at')
     search_fields = ('recipe_name', 'user__username')
     readonly_fields = ('created_at',)
+    inlines = [SavedRecipeIngredientInline]
+
+
+@admin.register(SavedIngredientCount)
+class SavedIngredientCountAdmin(admin.ModelAdmin):
+    list_display = ('user', 'name', 'recipes')
+    search_fields = ('name', 'user__username')
 
 
 @admin.register(WeeklyMealPlan)
@@ -32,3 +51,23 @@ class ShoppingItemAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('name', 'user__username')
     readonly_fields = ('created_at',)
+
+
+@admin.register(MealCategory)
+class MealCategoryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'listed', 'synced_at')
+    search_fields = ('name',)
+
+
+@admin.register(MealArea)
+class MealAreaAdmin(admin.ModelAdmin):
+    list_display = ('name', 'listed', 'synced_at')
+    search_fields = ('name',)
+
+
+@admin.register(Meal)
+class MealAdmin(admin.ModelAdmin):
+    list_display = ('name', 'id', 'category', 'area', 'synced_at')
+    list_filter = ('category', 'area')
+    search_fields = ('name', 'tags')
+    readonly_fields = ('synced_at',)
@@ -0,0 +1,261 @@
+"""Read-only JSON API for recipes and the user's saved recipes, planner and
+shopping list.
+
+Each resource is built once per data version (see ``recipes.versions``;
+every time while versions are off) and cached as plain lists and dicts, so
+a request is a cache read plus slicing and encoding. Lists take
+``offset``/``limit``, and every endpoint takes ``fields=a,b`` to return
+only some fields of each item. Bodies are encoded with orjson when it is
+installed.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from . import catalog, thumbnails, versions
+from .conditional import conditional, make_etag
+from .models import RatingSummary, SavedRecipe, ShoppingItem, WeeklyMealPlan
+from .shopping import ingredient_names
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # fall back to the stdlib encoder
+
+# Fields taken as they are from the TheMealDB payload
+PAYLOAD_FIELDS = (
+    'idMeal', 'strMeal', 'strCategory', 'strArea', 'strInstructions', 'strTags', 'strYoutube',
+    'strSource', 'strMealThumb',
+)
+RECIPE_FIELDS = PAYLOAD_FIELDS + ('thumbnails', 'ingredients', 'rating')
+SAVED_RECIPE_FIELDS = (
+    'id', 'recipe_id', 'recipe_name', 'recipe_image', 'thumbnail', 'ingredients_synced', 'created_at',
+)
+MEAL_PLAN_FIELDS = ('id', 'saved_recipe_id', 'recipe_id', 'recipe_name', 'thumbnail', 'day', 'meal_slot')
+SHOPPING_ITEM_FIELDS = ('id', 'name', 'in_recipes')
+
+
+class APIError(Exception):
+    """A bad query parameter, answered with 400."""
+
+
+class FastJSONResponse(HttpResponse):
+    """JSON response encoded with orjson when available."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        if orjson is not None:
+            content = orjson.dumps(data)
+        else:
+            content = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        super().__init__(content=content, **kwargs)
+
+
+def _cached(key, build):
+    if not versions.enabled():
+        return build()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.FRAGMENT_CACHE_TTL)
+    return data
+
+
+def _fields(request, allowed):
+    """The fields requested with ``fields=a,b``, or None for all of them."""
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise APIError(f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def _select(item, fields):
+    return item if fields is None else {field: item[field] for field in fields}
+
+
+def _page(request, items, fields):
+    """One ``offset``/``limit`` slice of a list, with its total count."""
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', settings.API_PAGE_SIZE)), 1), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise APIError('offset and limit must be integers')
+    end = offset + limit
+    return {
+        'count': len(items),
+        'next_offset': end if end < len(items) else None,
+        'results': [_select(item, fields) for item in items[offset:end]],
+    }
+
+
+def _respond(build):
+    try:
+        return FastJSONResponse(build())
+    except APIError as exc:
+        return FastJSONResponse({'error': str(exc)}, status=400)
+
+
+def recipe_data(meal_id):
+    """The API form of a recipe, or None if it is unavailable. Cached per
+    recipe version, i.e. until it is next rated."""
+    def build():
+        recipe = catalog.get_meal(meal_id)
+        if not recipe:
+            return None
+        summary = RatingSummary.objects.filter(recipe_id=meal_id).first()
+        data = {field: recipe.get(field) for field in PAYLOAD_FIELDS}
+        data.update({
+            'thumbnails': {
+                size: thumbnails.thumb_url(meal_id, size, recipe.get('strMealThumb'))
+                for size in settings.THUMBNAIL_SIZES
+            },
+            'ingredients': catalog.parse_ingredients(recipe),
+            'rating': {
+                'average': summary.average if summary else None,
+                'count': summary.count if summary else 0,
+            },
+        })
+        return data
+
+    if not versions.enabled():
+        return build()
+    key = f'recipes:api:recipe:{meal_id}:{versions.recipe_version(meal_id)}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        if data is not None:
+            cache.set(key, data, settings.RECIPE_CACHE_TTL)
+    return data
+
+
+def saved_recipes_data(user_id):
+    """The user's saved recipes, newest first (one query per user version)."""
+    def build():
+        return [
+            {
+                'id': saved_recipe.id,
+                'recipe_id': saved_recipe.recipe_id,
+                'recipe_name': saved_recipe.recipe_name,
+                'recipe_image': saved_recipe.recipe_image or '',
+                'thumbnail': thumbnails.thumb_url(saved_recipe.recipe_id, 'small', saved_recipe.recipe_image),
+                'ingredients_synced': saved_recipe.ingredients_synced,
+                'created_at': saved_recipe.created_at.isoformat(),
+            }
+            for saved_recipe in SavedRecipe.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+        ]
+    return _cached(f'recipes:api:saved:{user_id}:{versions.user_version(user_id)}', build)
+
+
+def planner_data(user_id):
+    """The user's planner as ``{day: {meal_slot: [entry, ...]}}`` (one query
+    per user version)."""
+    def build():
+        grid = {day: {meal_slot: [] for meal_slot, _ in WeeklyMealPlan.MEAL_SLOTS}
+                for day, _ in WeeklyMealPlan.DAYS_OF_WEEK}
+        plans = (WeeklyMealPlan.objects.filter(user_id=user_id)
+                 .select_related('saved_recipe').order_by('created_at', 'id'))
+        for plan in plans:
+            grid[plan.day][plan.meal_slot].append({
+                'id': plan.id,
+                'saved_recipe_id': plan.saved_recipe_id,
+                'recipe_id': plan.saved_recipe.recipe_id,
+                'recipe_name': plan.saved_recipe.recipe_name,
+                'thumbnail': thumbnails.thumb_url(plan.saved_recipe.recipe_id, 'small',
+                                                  plan.saved_recipe.recipe_image),
+                'day': plan.day,
+                'meal_slot': plan.meal_slot,
+            })
+        return grid
+    return _cached(f'recipes:api:planner:{user_id}:{versions.user_version(user_id)}', build)
+
+
+def shopping_list_data(user_id):
+    """The user's shopping list: the items on it, the ingredients of saved
+    recipes not on it yet, and the saved recipes whose ingredients are not
+    stored yet (three queries per user version)."""
+    def build():
+        recipe_ingredients = ingredient_names(user_id)
+        items = [
+            {'id': item_id, 'name': name, 'in_recipes': name in recipe_ingredients}
+            for item_id, name in ShoppingItem.objects.filter(user_id=user_id).values_list('id', 'name')
+        ]
+        on_list = {item['name'] for item in items}
+        return {
+            'items': items,
+            'to_add': sorted(recipe_ingredients - on_list),
+            'pending_recipes': list(SavedRecipe.objects.filter(user_id=user_id, ingredients_synced=False)
+                                    .values_list('recipe_name', flat=True)),
+        }
+    return _cached(f'recipes:api:shopping_list:{user_id}:{versions.user_version(user_id)}', build)
+
+
+def _query(request):
+    """The query string in a canonical order: the body depends on it."""
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def _recipe_etag(request, id):
+    if recipe_data(id) is None:
+        return None
+    return make_etag('api:recipe', versions.recipe_version(id), _query(request))
+
+
+def _user_etag(request):
+    return make_etag('api:user', request.path, versions.user_version(request.user.id), request.user.id,
+                     _query(request))
+
+
+@conditional(etag_func=_recipe_etag)
+def recipe_detail(request, id):
+    """A recipe with its ingredients, rating and thumbnail URLs."""
+    data = recipe_data(id)
+    if data is None:
+        return FastJSONResponse({'error': 'Recipe not found'}, status=404)
+    return _respond(lambda: _select(data, _fields(request, RECIPE_FIELDS)))
+
+
+@login_required
+@conditional(etag_func=_user_etag)
+def saved_recipes(request):
+    """The user's saved recipes, newest first, paginated."""
+    return _respond(lambda: _page(request, saved_recipes_data(request.user.id),
+                                  _fields(request, SAVED_RECIPE_FIELDS)))
+
+
+@login_required
+@conditional(etag_func=_user_etag)
+def planner(request):
+    """The user's planner grid, Monday..Sunday and Breakfast..Snack."""
+    def build():
+        fields = _fields(request, MEAL_PLAN_FIELDS)
+        grid = planner_data(request.user.id)
+        return {
+            'days': list(grid),
+            'meal_slots': [meal_slot for meal_slot, _ in WeeklyMealPlan.MEAL_SLOTS],
+            'grid': {
+                day: {meal_slot: [_select(plan, fields) for plan in plans] for meal_slot, plans in slots.items()}
+                for day, slots in grid.items()
+            },
+        }
+    return _respond(build)
+
+
+@login_required
+@conditional(etag_func=_user_etag)
+def shopping_list(request):
+    """The user's shopping list items (paginated), plus the recipe
+    ingredients not on it yet."""
+    def build():
+        data = shopping_list_data(request.user.id)
+        page = _page(request, data['items'], _fields(request, SHOPPING_ITEM_FIELDS))
+        page.update(to_add=data['to_add'], pending_recipes=data['pending_recipes'])
+        return page
+    return _respond(build)
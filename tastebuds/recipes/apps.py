@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .metrics import install_query_timer
+        from .pantry import warm
+        from .search import create_index
+
+        post_migrate.connect(create_index, sender=self)
+        request_started.connect(warm)
+        connection_created.connect(install_query_timer)
@@ -0,0 +1,145 @@
+"""Async versions of the recipe browsing views.
+
+These keep upstream I/O on the event loop (``async_client`` and the async
+ORM) so one ASGI worker can have many TheMealDB requests in flight. Once
+the recipes are resolved they hand over to the same render helpers as the
+sync views in ``views.py``, so both deployments produce identical pages.
+They are routed in place of the sync views when RECIPES_ASYNC_VIEWS is on.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from . import catalog, shopping, versions
+from .conditional import ashow_etag, conditional, shopping_list_etag, shopping_list_last_modified
+from .mealdb import afan_out, async_client
+from .random_pool import random_pool
+from .models import SavedRecipe
+from .views import index_random_data, index_search_data, render_shopping_list, render_show
+
+
+async def fetch_random_recipes(n=8, timeout=None):
+    """Async counterpart of ``views.fetch_random_recipes``."""
+    if timeout is None:
+        timeout = settings.MEALDB_RANDOM_DEADLINE
+    deadline = time.monotonic() + timeout
+
+    recipes = {}
+    for _ in range(3):
+        missing = n - len(recipes)
+        if missing <= 0 or time.monotonic() >= deadline:
+            break
+        results, _ = await afan_out(lambda _: async_client.meals('random.php'), range(missing), deadline)
+        for meals in results.values():
+            for meal in meals[:1]:
+                recipes.setdefault(meal['idMeal'], meal)
+
+    # Top up from the local catalog if upstream was too slow
+    if len(recipes) < n:
+        local = await sync_to_async(catalog.random_meals)(n - len(recipes), exclude=recipes.keys())
+        for meal in local:
+            recipes.setdefault(meal['idMeal'], meal)
+
+    return list(recipes.values())[:n]
+
+
+async def _filter(local_lookup, term, **params):
+    meals = await sync_to_async(local_lookup)(term)
+    if meals is not None:
+        return meals
+    try:
+        return await async_client.meals('filter.php', **params)
+    except Exception:
+        return []
+
+
+async def fetch_by_category(category):
+    """Async counterpart of ``views.fetch_by_category``."""
+    return await _filter(catalog.meals_by_category, category, c=category)
+
+
+async def fetch_by_region(region):
+    """Async counterpart of ``views.fetch_by_region``."""
+    return await _filter(catalog.meals_by_area, region, a=region)
+
+
+async def search_by_name(term):
+    """Async counterpart of ``views.search_by_name``."""
+    meals = await sync_to_async(catalog.search_meals)(term)
+    if await sync_to_async(catalog.fully_mirrored)():
+        return meals
+
+    try:
+        found = await async_client.meals('search.php', s=term)
+    except Exception:
+        return meals
+
+    return await sync_to_async(catalog.merge_search)(meals, found)
+
+
+async def _empty():
+    return []
+
+
+async def index(request):
+    category = request.GET.get('category', '').strip()
+    region = request.GET.get('region', '').strip()
+
+    if category or region:
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect(reverse('accounts.login'))
+
+        combined_results = None
+        if category and region:
+            combined_results = await sync_to_async(catalog.meals_by_facet)(category, region)
+
+        # The sync view runs these one after another; here they overlap
+        cat_results, reg_results = await asyncio.gather(
+            fetch_by_category(category) if category and combined_results is None else _empty(),
+            fetch_by_region(region) if region and combined_results is None else _empty(),
+        )
+        name_results = []
+        if category and not region and not cat_results:
+            name_results = await search_by_name(category)
+        template_data = index_search_data(category, region, cat_results, reg_results, name_results,
+                                          combined_results)
+    else:
+        recipes = await sync_to_async(random_pool.sample)(8)
+        if len(recipes) < 8:
+            recipes = await fetch_random_recipes(8)
+        template_data = index_random_data(recipes)
+    template_data['facets'] = await sync_to_async(catalog.facet_counts)()
+
+    return await sync_to_async(render)(request, 'recipes/index.html', {'template_data': template_data})
+
+
+@conditional(etag_func=ashow_etag)
+async def show(request, id):
+    recipe = await catalog.aget_meal(id)
+    return await sync_to_async(render_show)(request, id, recipe)
+
+
+@login_required
+@conditional(etag_func=shopping_list_etag, last_modified_func=shopping_list_last_modified)
+async def shopping_list(request):
+    user = await request.auser()
+    version = await sync_to_async(versions.user_version)(user.id)
+    fragment = await sync_to_async(versions.cached_fragment)('shopping_list', user.id, version, 0)
+    if fragment is not None:
+        return await sync_to_async(render_shopping_list)(request, [], fragment)
+
+    pending = [
+        saved_recipe async for saved_recipe
+        in SavedRecipe.objects.filter(user=user, ingredients_synced=False)
+    ]
+    unavailable_recipes = []
+    if pending:
+        recipes, _ = await catalog.aget_meals([saved_recipe.recipe_id for saved_recipe in pending])
+        unavailable_recipes = await sync_to_async(shopping.store_resolved)(pending, recipes)
+    return await sync_to_async(render_shopping_list)(request, unavailable_recipes)
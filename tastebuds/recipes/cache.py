@@ -0,0 +1,229 @@
+"""Two-tier cache for recipe payloads.
+
+A bounded in-process LRU sits on top of the configured Django cache
+backend. Every entry carries a fresh-until and a stale-until timestamp:
+fresh entries are served as is, stale ones are served while a background
+refresh runs, and expired ones are treated as misses. ``None`` values are
+cached for a shorter time so unknown ids do not keep hitting upstream.
+
+The ``a``-prefixed methods go to the backend through its async API, so
+async views don't block the event loop on cache I/O.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.db import close_old_connections
+from django.utils.functional import SimpleLazyObject
+
+from .mealdb import get_background_executor
+
+_MISSING = object()
+
+
+class TieredCache:
+    """In-process LRU in front of a Django cache backend, with TTLs and SWR."""
+
+    MISSING = _MISSING
+
+    def __init__(self, name, maxsize, ttl, stale_ttl, negative_ttl, backend=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend if backend is not None else default_cache
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._counters = dict.fromkeys(
+            ['hits', 'local_hits', 'backend_hits', 'stale_hits', 'negative_hits',
+             'misses', 'evictions', 'refreshes', 'refresh_errors'],
+            0,
+        )
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _backend_key(self, key):
+        return f'{self.name}:{key}'
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _read_local(self, key):
+        """Return the unexpired in-process entry for key, or None."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+        if entry is not None and time.time() < entry[2]:
+            self._count('local_hits')
+            return entry
+        return None
+
+    def _from_backend(self, key, entry):
+        """Return an entry read from the backend if it has not expired,
+        keeping it in-process, or None."""
+        if entry is not None and time.time() < entry[2]:
+            self._count('backend_hits')
+            self._remember(key, entry)
+            return entry
+        return None
+
+    def _read(self, key):
+        """Return the (value, fresh_until, stale_until) entry for key, or None."""
+        entry = self._read_local(key)
+        if entry is None:
+            entry = self._from_backend(key, self.backend.get(self._backend_key(key)))
+        return entry
+
+    def _serve(self, key, entry, loader):
+        value, fresh_until, _ = entry
+        if time.time() >= fresh_until:
+            self._count('stale_hits')
+            if loader is not None:
+                self._refresh_later(key, loader)
+        else:
+            self._count('hits')
+        if value is None:
+            self._count('negative_hits')
+        return value
+
+    def _refresh_later(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        get_background_executor().submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader(key))
+            self._count('refreshes')
+        except Exception:
+            self._count('refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            close_old_connections()
+
+    def get(self, key, loader=None):
+        """Return the cached value for key, or ``MISSING``.
+
+        A stale entry is returned as well; if ``loader`` is given it is
+        used to refresh the entry in the background.
+        """
+        entry = self._read(key)
+        if entry is None:
+            self._count('misses')
+            return _MISSING
+        return self._serve(key, entry, loader)
+
+    async def aget(self, key, loader=None):
+        """Async counterpart of ``get``; reads the backend with ``aget``."""
+        entry = self._read_local(key)
+        if entry is None:
+            entry = self._from_backend(key, await self.backend.aget(self._backend_key(key)))
+        if entry is None:
+            self._count('misses')
+            return _MISSING
+        return self._serve(key, entry, loader)
+
+    def get_many(self, keys, loader=None):
+        """Return a dict of the cached (possibly ``None``) values among keys.
+
+        The keys missing in-process are read from the backend in one call.
+        """
+        entries = {key: self._read_local(key) for key in keys}
+        remote = [key for key, entry in entries.items() if entry is None]
+        if remote:
+            stored = self.backend.get_many([self._backend_key(key) for key in remote])
+            for key in remote:
+                entries[key] = self._from_backend(key, stored.get(self._backend_key(key)))
+        return self._found(entries, loader)
+
+    async def aget_many(self, keys, loader=None):
+        """Async counterpart of ``get_many``; reads the backend with ``aget_many``."""
+        entries = {key: self._read_local(key) for key in keys}
+        remote = [key for key, entry in entries.items() if entry is None]
+        if remote:
+            stored = await self.backend.aget_many([self._backend_key(key) for key in remote])
+            for key in remote:
+                entries[key] = self._from_backend(key, stored.get(self._backend_key(key)))
+        return self._found(entries, loader)
+
+    def _found(self, entries, loader):
+        found = {}
+        for key, entry in entries.items():
+            if entry is None:
+                self._count('misses')
+            else:
+                found[key] = self._serve(key, entry, loader)
+        return found
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling ``loader(key)`` on a miss.
+
+        Exceptions from the loader propagate and are not cached.
+        """
+        value = self.get(key, loader)
+        if value is _MISSING:
+            value = loader(key)
+            self.set(key, value)
+        return value
+
+    def _entry(self, key, value):
+        """Remember value in-process; return its entry and backend timeout."""
+        now = time.time()
+        ttl = self.ttl if value is not None else self.negative_ttl
+        entry = (value, now + ttl, now + ttl + self.stale_ttl)
+        self._remember(key, entry)
+        return entry, ttl + self.stale_ttl
+
+    def set(self, key, value):
+        """Cache value for key; ``None`` is cached with the negative TTL."""
+        entry, timeout = self._entry(key, value)
+        self.backend.set(self._backend_key(key), entry, timeout=timeout)
+
+    async def aset(self, key, value):
+        """Async counterpart of ``set``; writes the backend with ``aset``."""
+        entry, timeout = self._entry(key, value)
+        await self.backend.aset(self._backend_key(key), entry, timeout=timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._lru.pop(key, None)
+        self.backend.delete(self._backend_key(key))
+
+    def clear(self):
+        """Drop the in-process tier (the shared backend is left alone)."""
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self):
+        """Return a snapshot of the hit/miss/eviction counters."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._lru)
+            stats['maxsize'] = self.maxsize
+        stats['hits_total'] = stats['hits'] + stats['stale_hits']
+        return stats
+
+
+recipe_cache = SimpleLazyObject(lambda: TieredCache(
+    'recipe',
+    maxsize=settings.RECIPE_CACHE_SIZE,
+    ttl=settings.RECIPE_CACHE_TTL,
+    stale_ttl=settings.RECIPE_CACHE_STALE_TTL,
+    negative_ttl=settings.RECIPE_CACHE_NEGATIVE_TTL,
+))
@@ -0,0 +1,378 @@
+"""Local mirror of the TheMealDB catalog.
+
+The views read recipes from here first and only go out to TheMealDB for
+recipes that have not been mirrored yet. Anything fetched from upstream on
+the request path is written back so the next request is served locally.
+
+Recipes written back one at a time don't make a category or area complete,
+so lists are only answered locally for the categories and areas that
+sync_mealdb has mirrored in full (``synced_at`` is set). Once the list.php
+names are stored, a term that is no category or area at all has no meals
+either, so it doesn't go upstream. Likewise free text search is answered
+locally alone only once every listed category is mirrored in full.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import pantry, search
+from .cache import recipe_cache
+from .mealdb import afan_out, async_client, client, fan_out
+from .models import Meal, MealArea, MealCategory, MealFacet, MealIngredient
+
+FACET_COUNTS_KEY = 'recipes:facet_counts'
+
+
+def parse_ingredients(meal):
+    """Return the ingredient/measure pairs of a TheMealDB payload."""
+    ingredients = []
+    for i in range(1, 21):
+        ingredient = meal.get(f'strIngredient{i}')
+        measure = meal.get(f'strMeasure{i}')
+        if ingredient and ingredient.strip():
+            ingredients.append({
+                'ingredient': ingredient.strip(),
+                'measure': measure.strip() if measure else '',
+            })
+    return ingredients
+
+
+def summarize(meal):
+    """Return the short form of a meal, as returned by filter.php."""
+    return {
+        'idMeal': str(meal.id),
+        'strMeal': meal.name,
+        'strMealThumb': meal.thumbnail,
+    }
+
+
+def _clean(value):
+    return value.strip() if value else ''
+
+
+@transaction.atomic
+def store_meal(payload):
+    """Create or update the local copy of a lookup.php payload."""
+    category_name = _clean(payload.get('strCategory'))
+    area_name = _clean(payload.get('strArea'))
+    category = MealCategory.objects.get_or_create(name=category_name)[0] if category_name else None
+    area = MealArea.objects.get_or_create(name=area_name)[0] if area_name else None
+
+    meal, _ = Meal.objects.update_or_create(
+        id=int(payload['idMeal']),
+        defaults={
+            'name': _clean(payload.get('strMeal')),
+            'category': category,
+            'area': area,
+            'thumbnail': _clean(payload.get('strMealThumb')),
+            'tags': _clean(payload.get('strTags')),
+            'data': payload,
+        }
+    )
+
+    ingredients = parse_ingredients(payload)
+    meal.ingredients.all().delete()
+    MealIngredient.objects.bulk_create([
+        MealIngredient(meal=meal, position=position, name=item['ingredient'], measure=item['measure'])
+        for position, item in enumerate(ingredients, start=1)
+    ])
+    search.index_meal(payload)
+    transaction.on_commit(lambda: pantry.update_meal(
+        meal.id, meal.name, meal.thumbnail, [item['ingredient'] for item in ingredients]))
+    recipe_cache.set(str(meal.id), payload)
+    return meal
+
+
+def store_categories(names):
+    """Store the category names of list.php."""
+    for name in filter(None, map(_clean, names)):
+        MealCategory.objects.update_or_create(name=name, defaults={'listed': True})
+
+
+def store_areas(names):
+    """Store the area names of list.php."""
+    for name in filter(None, map(_clean, names)):
+        MealArea.objects.update_or_create(name=name, defaults={'listed': True})
+
+
+def mark_category_synced(name):
+    """Record that every recipe of a category is stored locally."""
+    MealCategory.objects.filter(name=_clean(name)).update(synced_at=timezone.now())
+
+
+def mark_area_synced(name):
+    """Record that every recipe of an area is stored locally."""
+    MealArea.objects.filter(name=_clean(name)).update(synced_at=timezone.now())
+
+
+def fetch_meal(meal_id):
+    """Fetch a single recipe from lookup.php, bypassing the local mirror.
+
+    Returns None when TheMealDB does not know the id and raises on
+    transport errors.
+    """
+    return client.lookup(meal_id)
+
+
+def _load_meal(meal_id):
+    """Load a recipe from the local mirror, falling back to lookup.php."""
+    try:
+        return Meal.objects.only('data').get(id=int(meal_id)).data
+    except (Meal.DoesNotExist, ValueError):
+        pass
+
+    meal = fetch_meal(meal_id)
+    if meal:
+        store_meal(meal)
+    return meal
+
+
+def get_meal(meal_id):
+    """Return the full payload of a recipe, or None if it is unavailable.
+
+    Lookups go through the recipe cache, then the local mirror, then the API.
+    """
+    try:
+        return recipe_cache.get_or_load(str(meal_id), _load_meal)
+    except Exception:
+        return None
+
+
+def local_meal(meal_id):
+    """Return the payload of a recipe if it is cached or mirrored locally,
+    else None. Never calls TheMealDB."""
+    meal = recipe_cache.get(str(meal_id))
+    if meal is recipe_cache.MISSING or meal is None:
+        meal = Meal.objects.filter(id=int(meal_id)).values_list('data', flat=True).first()
+    return meal
+
+
+def known_missing(meal_id):
+    """True if TheMealDB recently answered that the recipe does not exist
+    (a negative entry in the recipe cache). Never calls TheMealDB."""
+    return recipe_cache.get(str(meal_id)) is None
+
+
+def get_meals(meal_ids, timeout=None):
+    """Return the full payloads of several recipes in one batch.
+
+    Cached and locally mirrored recipes are read first (the latter with a
+    single query); the rest are fetched from lookup.php concurrently within
+    ``timeout`` seconds (MEALDB_PAGE_DEADLINE by default). Returns
+    ``(meals, unavailable)``: a dict keyed by the id as a string, and the
+    ids that could not be resolved because they failed, timed out or do
+    not exist.
+    """
+    if timeout is None:
+        timeout = settings.MEALDB_PAGE_DEADLINE
+    deadline = time.monotonic() + timeout
+
+    wanted = {str(meal_id) for meal_id in meal_ids}
+    cached = recipe_cache.get_many(wanted, _load_meal)
+    meals = {meal_id: meal for meal_id, meal in cached.items() if meal}
+    unavailable = [meal_id for meal_id, meal in cached.items() if not meal]
+
+    numeric = [int(meal_id) for meal_id in wanted - cached.keys() if meal_id.isdigit()]
+    for meal_id, data in Meal.objects.filter(id__in=numeric).values_list('id', 'data'):
+        meals[str(meal_id)] = data
+        recipe_cache.set(str(meal_id), data)
+
+    fetched, failed = fan_out(fetch_meal, wanted - cached.keys() - meals.keys(), deadline)
+    unavailable.extend(failed)
+    for meal_id, meal in fetched.items():
+        if meal:
+            store_meal(meal)
+            meals[meal_id] = meal
+        else:
+            recipe_cache.set(meal_id, None)
+            unavailable.append(meal_id)
+    return meals, unavailable
+
+
+async def aget_meal(meal_id):
+    """Async counterpart of ``get_meal``."""
+    key = str(meal_id)
+    meal = await recipe_cache.aget(key, _load_meal)
+    if meal is not recipe_cache.MISSING:
+        return meal
+
+    try:
+        meal = (await Meal.objects.only('data').aget(id=int(meal_id))).data
+    except (Meal.DoesNotExist, ValueError):
+        pass
+    else:
+        await recipe_cache.aset(key, meal)
+        return meal
+
+    try:
+        meal = await async_client.lookup(meal_id)
+    except Exception:
+        return None
+
+    if meal:
+        await sync_to_async(store_meal)(meal)
+    else:
+        await recipe_cache.aset(key, None)
+    return meal
+
+
+async def aget_meals(meal_ids, timeout=None):
+    """Async counterpart of ``get_meals``."""
+    if timeout is None:
+        timeout = settings.MEALDB_PAGE_DEADLINE
+    deadline = time.monotonic() + timeout
+
+    wanted = {str(meal_id) for meal_id in meal_ids}
+    cached = await recipe_cache.aget_many(wanted, _load_meal)
+    meals = {meal_id: meal for meal_id, meal in cached.items() if meal}
+    unavailable = [meal_id for meal_id, meal in cached.items() if not meal]
+
+    numeric = [int(meal_id) for meal_id in wanted - cached.keys() if meal_id.isdigit()]
+    async for meal_id, data in Meal.objects.filter(id__in=numeric).values_list('id', 'data'):
+        meals[str(meal_id)] = data
+        await recipe_cache.aset(str(meal_id), data)
+
+    fetched, failed = await afan_out(async_client.lookup, wanted - cached.keys() - meals.keys(), deadline)
+    unavailable.extend(failed)
+    for meal_id, meal in fetched.items():
+        if meal:
+            await sync_to_async(store_meal)(meal)
+            meals[meal_id] = meal
+        else:
+            await recipe_cache.aset(meal_id, None)
+            unavailable.append(meal_id)
+    return meals, unavailable
+
+
+def _mirrored(model, name):
+    """Whether all meals of a category or area (by name, case-insensitive)
+    are stored locally: True, False if it is not a listed one at all (so it
+    has no meals), or None if they have to come from upstream."""
+    row = model.objects.filter(name__iexact=name).values_list('synced_at').first()
+    if row is None:
+        return False if model.objects.filter(listed=True).exists() else None
+    return True if row[0] else None
+
+
+def meals_by_category(category):
+    """Return the meals of a category (case-insensitive) from the local
+    catalog, or None if the category is not mirrored in full."""
+    mirrored = _mirrored(MealCategory, category)
+    if not mirrored:
+        return None if mirrored is None else []
+    meals = Meal.objects.filter(category__name__iexact=category).only('id', 'name', 'thumbnail')
+    return [summarize(meal) for meal in meals]
+
+
+def meals_by_area(area):
+    """Return the meals of an area (case-insensitive) from the local
+    catalog, or None if the area is not mirrored in full."""
+    mirrored = _mirrored(MealArea, area)
+    if not mirrored:
+        return None if mirrored is None else []
+    meals = Meal.objects.filter(area__name__iexact=area).only('id', 'name', 'thumbnail')
+    return [summarize(meal) for meal in meals]
+
+
+def meals_by_facet(category, area):
+    """Return the meals of a category and an area, by name, from the
+    precomputed facet table, or None if neither is mirrored in full (or
+    the facets have not been built yet).
+    """
+    ids = (MealFacet.objects.filter(category__name__iexact=category, area__name__iexact=area)
+           .values_list('meal_ids', flat=True).first())
+    if ids is None:
+        # No facet: the pair is empty if either side is complete (or unknown)
+        if _mirrored(MealCategory, category) is None and _mirrored(MealArea, area) is None:
+            return None
+        return []
+    meals = Meal.objects.filter(id__in=ids).only('id', 'name', 'thumbnail').in_bulk()
+    return [summarize(meals[meal_id]) for meal_id in ids if meal_id in meals]
+
+
+@transaction.atomic
+def refresh_facets():
+    """Rebuild the category x area facet table from the fully mirrored
+    categories and areas; returns the number of facets."""
+    facets = {}
+    meals = (Meal.objects.filter(category__isnull=False, area__isnull=False)
+             .filter(Q(category__synced_at__isnull=False) | Q(area__synced_at__isnull=False))
+             .order_by('name', 'id').values_list('category_id', 'area_id', 'id'))
+    for category_id, area_id, meal_id in meals:
+        facets.setdefault((category_id, area_id), []).append(meal_id)
+
+    MealFacet.objects.all().delete()
+    MealFacet.objects.bulk_create([
+        MealFacet(category_id=category_id, area_id=area_id, meal_ids=ids, count=len(ids))
+        for (category_id, area_id), ids in facets.items()
+    ])
+    transaction.on_commit(lambda: cache.delete(FACET_COUNTS_KEY))
+    return len(facets)
+
+
+def facet_counts():
+    """Return ``{'categories': [(name, count)], 'areas': [(name, count)]}``
+    from the facet table for the fully mirrored categories and areas, each
+    sorted by name.
+
+    Cached until the facets are next rebuilt.
+    """
+    counts = cache.get(FACET_COUNTS_KEY)
+    if counts is None:
+        categories = {}
+        areas = {}
+        facets = MealFacet.objects.values_list(
+            'category__name', 'category__synced_at', 'area__name', 'area__synced_at', 'count')
+        for category, category_synced_at, area, area_synced_at, count in facets:
+            if category_synced_at:
+                categories[category] = categories.get(category, 0) + count
+            if area_synced_at:
+                areas[area] = areas.get(area, 0) + count
+        counts = {
+            'categories': sorted(categories.items()),
+            'areas': sorted(areas.items()),
+        }
+        cache.set(FACET_COUNTS_KEY, counts, timeout=None)
+    return counts
+
+
+def random_meals(n, exclude=()):
+    """Return up to n random locally known meals, skipping the given ids."""
+    meals = (Meal.objects.exclude(id__in=[int(i) for i in exclude])
+             .only('id', 'name', 'thumbnail').order_by('?')[:n])
+    return [summarize(meal) for meal in meals]
+
+
+def search_meals(term, limit=50):
+    """Return the full payloads of the locally known meals matching a free
+    text query (name, category, area, tags, ingredients), best match first."""
+    ids = search.search_ids(term, limit)
+    payloads = dict(Meal.objects.filter(id__in=ids).values_list('id', 'data'))
+    return [payloads[meal_id] for meal_id in ids if meal_id in payloads]
+
+
+def fully_mirrored():
+    """Whether every recipe of every list.php category is stored locally,
+    so the local search has all the matches there are."""
+    categories = MealCategory.objects.filter(listed=True)
+    return categories.exists() and not categories.filter(synced_at__isnull=True).exists()
+
+
+def merge_search(meals, found):
+    """Merge the search.php results for a term into its local matches.
+
+    Stores the recipes not mirrored yet and returns upstream's (name)
+    matches first, then the local ones it doesn't have (ingredient, tag,
+    ... matches).
+    """
+    known = set(Meal.objects.filter(id__in=[int(meal['idMeal']) for meal in found])
+                .values_list('id', flat=True))
+    for meal in found:
+        if int(meal['idMeal']) not in known:
+            store_meal(meal)
+    found_ids = {meal['idMeal'] for meal in found}
+    return found + [meal for meal in meals if meal['idMeal'] not in found_ids]
@@ -0,0 +1,176 @@
+"""Conditional GET for the recipe pages and the reviews feed.
+
+ETags and Last-Modified dates come from the data versions in
+``recipes.versions`` (plus a hash of the recipe payload on recipe pages).
+Reading them costs a cache lookup, so a client polling an unchanged page
+gets 304 Not Modified before any query, upstream call or template render.
+
+HTML pages also vary on the user and their CSRF secret, both of which are
+rendered into the page, and are never validated while flash messages are
+waiting to be shown. Nothing is validated while versions are off (see
+``versions.enabled``).
+"""
+import datetime
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import close_old_connections
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from . import catalog, versions
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def make_etag(*parts):
+    return f'"{_digest(":".join(map(str, parts)))}"'
+
+
+def _timestamp(version):
+    return datetime.datetime.fromtimestamp(version, datetime.timezone.utc)
+
+
+def _visitor(request):
+    """The per-visitor parts of an HTML page, or None if the page can't be
+    validated because it will show pending messages."""
+    storage = getattr(request, '_messages', None)
+    if storage is not None and len(storage):
+        return None
+    return request.user.id, request.META.get('CSRF_COOKIE', '')
+
+
+def payload_hash(recipe):
+    """Hash of a recipe's TheMealDB payload ('missing' if there is none)."""
+    return _digest(json.dumps(recipe, sort_keys=True)) if recipe else 'missing'
+
+
+def _show_etag(request, id, recipe):
+    visitor = _visitor(request)
+    if visitor is None:
+        return None
+    user_version = versions.user_version(request.user.id) if request.user.is_authenticated else None
+    return make_etag('show', payload_hash(recipe), versions.recipe_version(id), user_version, *visitor)
+
+
+def show_etag(request, id):
+    # get_meal fills the recipe cache, so the view's own lookup is a hit
+    return _show_etag(request, id, catalog.get_meal(id))
+
+
+async def ashow_etag(request, id):
+    """``show_etag`` for the async view, which must not wait on a blocking
+    lookup: the recipe comes from ``catalog.aget_meal``."""
+    recipe = await catalog.aget_meal(id)
+    return await _in_worker(_show_etag)(request, id, recipe)
+
+
+def planner_etag(request):
+    visitor = _visitor(request)
+    if visitor is None:
+        return None
+    return make_etag('planner', versions.user_version(request.user.id), *visitor)
+
+
+def planner_last_modified(request):
+    if _visitor(request) is None:
+        return None
+    return _timestamp(versions.user_version(request.user.id))
+
+
+def shopping_list_etag(request):
+    # Only a list rendered without unavailable recipes is stable: one
+    # listing recipes to retry may change without a version bump
+    visitor = _visitor(request)
+    version = versions.user_version(request.user.id)
+    if visitor is None or versions.cached_fragment('shopping_list', request.user.id, version, 0) is None:
+        return None
+    return make_etag('shopping_list', version, *visitor)
+
+
+def shopping_list_last_modified(request):
+    version = versions.user_version(request.user.id)
+    if _visitor(request) is None or versions.cached_fragment('shopping_list', request.user.id, version, 0) is None:
+        return None
+    return _timestamp(version)
+
+
+def reviews_etag(request, id):
+    return make_etag('reviews', versions.recipe_version(id))
+
+
+def reviews_last_modified(request, id):
+    return _timestamp(versions.recipe_version(id))
+
+
+def _in_worker(func):
+    """``func`` as a coroutine run in a thread of its own rather than the
+    one thread-sensitive thread the rest of the request shares. Closes the
+    database connection it may have opened there."""
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def _versioned(func):
+    """``func``, answering None while versions are off."""
+    if func is None:
+        return None
+
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def ainner(request, *args, **kwargs):
+            return await func(request, *args, **kwargs) if versions.enabled() else None
+        return ainner
+
+    @wraps(func)
+    def inner(request, *args, **kwargs):
+        return func(request, *args, **kwargs) if versions.enabled() else None
+    return inner
+
+
+def conditional(etag_func=None, last_modified_func=None):
+    """``django.views.decorators.http.condition`` for sync and async views.
+
+    For an async view the validators may be coroutine functions; others
+    read the session, the cache or the database, so they are computed in a
+    worker thread.
+    """
+    etag_func, last_modified_func = _versioned(etag_func), _versioned(last_modified_func)
+
+    def decorator(view):
+        if not iscoroutinefunction(view):
+            return condition(etag_func, last_modified_func)(view)
+
+        async def validator(func, request, *args, **kwargs):
+            if func is None:
+                return None
+            if iscoroutinefunction(func):
+                return await func(request, *args, **kwargs)
+            return await _in_worker(func)(request, *args, **kwargs)
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await validator(etag_func, request, *args, **kwargs)
+            last_modified = await validator(last_modified_func, request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            last_modified = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
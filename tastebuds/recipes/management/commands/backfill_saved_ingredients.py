@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes import catalog, shopping
+from recipes.models import SavedRecipe
+
+
+class Command(BaseCommand):
+    help = ('Store the ingredients of saved recipes that were saved before they were persisted, '
+            'and rebuild the per-user ingredient counts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Saved recipes resolved per batch.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = SavedRecipe.objects.filter(ingredients_synced=False).order_by('id')
+        done = failed = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            recipes, _ = catalog.get_meals([saved_recipe.recipe_id for saved_recipe in batch])
+            unavailable = shopping.store_resolved(batch, recipes)
+            failed += len(unavailable)
+            done += len(batch) - len(unavailable)
+            self.stdout.write(f'{done} stored, {failed} unavailable')
+
+        counts = shopping.recompute_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {done} saved recipes ({failed} unavailable), {counts} ingredient counts.'))
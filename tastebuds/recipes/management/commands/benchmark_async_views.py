@@ -0,0 +1,108 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from recipes import async_views, views
+from recipes.cache import recipe_cache
+from recipes.mealdb import async_client, reset_clients
+from recipes.standin import MealDBStandIn, synthetic_meals
+
+
+async def _anonymous():
+    return AnonymousUser()
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the sync and async browsing views against a '
+            'local TheMealDB stand-in with simulated latency. Runs on a throwaway '
+            'test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Seconds the stand-in waits before answering each call.')
+        parser.add_argument('--requests', type=int, default=64,
+                            help='Requests to issue per view and mode.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads for the sync views (like WSGI threads).')
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Requests in flight at once for the async views.')
+        parser.add_argument('--pool-size', type=int, default=100,
+                            help='Upstream connection pool size (MEALDB_POOL_SIZE) for both modes.')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with MealDBStandIn(synthetic_meals(300), latency=options['latency']) as standin:
+                with override_settings(MEALDB_BASE_URL=standin.base_url,
+                                       MEALDB_POOL_SIZE=options['pool_size']):
+                    reset_clients()
+                    try:
+                        self.run_benchmarks(options)
+                    finally:
+                        reset_clients()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_benchmarks(self, options):
+        # show() is requested with ids the stand-in does not know, so every
+        # request costs exactly one upstream lookup and no database writes
+        targets = [
+            ('index', '/recipes/', lambda i: {}),
+            ('show', '/recipes/0/', lambda i: {'id': 10_000_000 + i}),
+        ]
+        self.stdout.write(f"{'view':<8}{'mode':<7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, path, kwargs in targets:
+            for mode in ('sync', 'async'):
+                recipe_cache.clear()
+                if mode == 'sync':
+                    elapsed, latencies = self.run_sync(getattr(views, name), path, kwargs, options)
+                else:
+                    elapsed, latencies = asyncio.run(
+                        self.run_async(getattr(async_views, name), path, kwargs, options))
+                latencies.sort()
+                self.stdout.write(
+                    f"{name:<8}{mode:<7}{len(latencies) / elapsed:>9.1f}"
+                    f"{statistics.median(latencies) * 1000:>10.0f}"
+                    f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:>10.0f}"
+                )
+
+    def run_sync(self, view, path, kwargs, options):
+        factory = RequestFactory()
+
+        def call(i):
+            request = factory.get(path)
+            request.user = AnonymousUser()
+            started = time.perf_counter()
+            view(request, **kwargs(i))
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            latencies = list(executor.map(call, range(options['requests'])))
+        return time.perf_counter() - started, latencies
+
+    async def run_async(self, view, path, kwargs, options):
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def call(i):
+            async with semaphore:
+                request = factory.get(path)
+                request.user = AnonymousUser()
+                request.auser = _anonymous
+                started = time.perf_counter()
+                await view(request, **kwargs(i))
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call(i) for i in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        await async_client.close()
+        return elapsed, list(latencies)
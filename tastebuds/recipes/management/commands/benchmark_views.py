@@ -0,0 +1,208 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from recipes import catalog, ratings, shopping
+from recipes.cache import recipe_cache
+from recipes.mealdb import reset_clients
+from recipes.models import Rating, SavedRecipe, ShoppingItem, WeeklyMealPlan
+from recipes.standin import MealDBStandIn, load_fixture, synthetic_meals
+
+# Seeded datasets: meals served by the stand-in (``mirrored`` of them also in
+# the local catalog), users, and per user saved recipes and planner entries;
+# shopping items of the benchmark user and ratings per recipe
+DATASETS = {
+    'small': {'meals': 50, 'mirrored': 1.0, 'users': 20, 'saved': 5, 'plans': 5, 'items': 10, 'ratings': 3},
+    'medium': {'meals': 300, 'mirrored': 0.8, 'users': 200, 'saved': 20, 'plans': 14, 'items': 30, 'ratings': 20},
+    'large': {'meals': 1000, 'mirrored': 0.5, 'users': 2000, 'saved': 50, 'plans': 21, 'items': 60, 'ratings': 100},
+}
+
+VIEWS = ('index', 'show', 'save_recipe', 'planner', 'shopping_list', 'admin_dashboard')
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+class Command(BaseCommand):
+    help = ('Report latency percentiles, database queries and TheMealDB calls per request '
+            'for the main views, on seeded datasets of different sizes and against a local '
+            'TheMealDB stand-in. Runs on a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', default='small,medium',
+                            help=f'Comma-separated datasets to seed and run: {", ".join(DATASETS)}.')
+        parser.add_argument('--views', default=','.join(VIEWS),
+                            help='Comma-separated views to benchmark.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Measured requests per view (after one warm-up request).')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the caches before every request.')
+        parser.add_argument('--fixture',
+                            help='JSON file of lookup.php payloads to use instead of synthetic meals.')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Seconds the stand-in waits before answering each call.')
+        parser.add_argument('--jitter', type=float, default=0.0,
+                            help='Up to this many extra seconds of stand-in latency per call.')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of stand-in calls (0..1) that fail with 503.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        datasets = [name for name in options['datasets'].split(',') if name]
+        views = [name for name in options['views'].split(',') if name]
+        unknown = [name for name in datasets if name not in DATASETS] + [name for name in views if name not in VIEWS]
+        if unknown:
+            raise CommandError(f'Unknown datasets or views: {", ".join(unknown)}')
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+
+        self.stdout.write(
+            f"{'dataset':<8}{'view':<16}{'p50 ms':>8}{'p90 ms':>8}{'p99 ms':>8}{'max ms':>8}"
+            f"{'queries':>9}{'max q':>7}{'upstream':>10}{'errors':>8}"
+        )
+        setup_test_environment()
+        try:
+            for name in datasets:
+                self.run_dataset(name, DATASETS[name], views, options)
+        finally:
+            teardown_test_environment()
+
+    def run_dataset(self, name, spec, views, options):
+        rng = random.Random(options['seed'])
+        if options['fixture']:
+            meals = load_fixture(options['fixture'])[:spec['meals']]
+        else:
+            meals = synthetic_meals(spec['meals'], seed=options['seed'])
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with MealDBStandIn(meals, latency=options['latency'], jitter=options['jitter'],
+                               error_rate=options['error_rate'], seed=options['seed']) as standin:
+                # One process, so its per-process cache may hold the versions
+                with override_settings(MEALDB_BASE_URL=standin.base_url, VERSIONED_CACHING=True):
+                    reset_clients()
+                    try:
+                        user = self.seed(meals, spec, rng)
+                        client = Client()
+                        client.force_login(user)
+                        for view in views:
+                            self.report(name, view, self.measure(client, standin, meals, view, options))
+                    finally:
+                        reset_clients()
+        finally:
+            cache.clear()
+            recipe_cache.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, meals, spec, rng):
+        """Fill the test database; returns the (staff) benchmark user."""
+        mirrored = meals[:int(len(meals) * spec['mirrored'])]
+        for meal in mirrored:
+            catalog.store_meal(meal)
+        if len(mirrored) == len(meals):
+            # As sync_mealdb would after a complete run
+            catalog.store_categories({meal['strCategory'] for meal in meals})
+            for meal in meals:
+                catalog.mark_category_synced(meal['strCategory'])
+                catalog.mark_area_synced(meal['strArea'])
+        catalog.refresh_facets()
+
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password='!',
+                 is_active=i == 0 or i % 10 != 0, is_staff=i == 0, is_superuser=i == 0,
+                 date_joined=now - timedelta(hours=i))
+            for i in range(spec['users'])
+        ], batch_size=500)
+
+        meal_ids = [meal['idMeal'] for meal in meals]
+        saved = SavedRecipe.objects.bulk_create([
+            SavedRecipe(user=user, recipe_id=meal_id, recipe_name=f'Recipe {meal_id}')
+            for user in users
+            for meal_id in rng.sample(meal_ids, min(spec['saved'], len(meal_ids)))
+        ], batch_size=1000)
+
+        by_user = {}
+        for saved_recipe in saved:
+            by_user.setdefault(saved_recipe.user_id, []).append(saved_recipe)
+        days = [day for day, _ in WeeklyMealPlan.DAYS_OF_WEEK]
+        meal_slots = [meal_slot for meal_slot, _ in WeeklyMealPlan.MEAL_SLOTS]
+        WeeklyMealPlan.objects.bulk_create([
+            WeeklyMealPlan(user_id=user_id, saved_recipe=rng.choice(saved_recipes),
+                           day=rng.choice(days), meal_slot=rng.choice(meal_slots))
+            for user_id, saved_recipes in by_user.items()
+            for _ in range(spec['plans'])
+        ], batch_size=1000)
+
+        # The benchmark user's saved recipes have their ingredients stored
+        user = users[0]
+        shopping.store_resolved(by_user.get(user.id, []), {meal['idMeal']: meal for meal in meals})
+        ShoppingItem.objects.bulk_create(
+            [ShoppingItem(user=user, name=f'Item {i}') for i in range(spec['items'])])
+
+        Rating.objects.bulk_create([
+            Rating(user=rater, recipe_id=int(meal_id), rating=rng.randint(1, 5), comment='Tasty')
+            for meal_id in meal_ids
+            for rater in rng.sample(users, min(spec['ratings'], len(users)))
+        ], batch_size=1000)
+        ratings.recompute_summaries()
+
+        cache.clear()
+        recipe_cache.clear()
+        return user
+
+    def measure(self, client, standin, meals, view, options):
+        # Stride through the meals so show() visits mirrored and upstream-only ones
+        meal_ids = [meal['idMeal'] for meal in meals]
+        meal_ids = [meal_ids[i * 7919 % len(meal_ids)] for i in range(len(meal_ids))]
+        requests = {
+            'index': lambda i: client.get(reverse('recipes.index')),
+            'show': lambda i: client.get(reverse('recipes.show', args=[meal_ids[i % len(meal_ids)]])),
+            # Saves and unsaves in turn
+            'save_recipe': lambda i: client.post(reverse('recipes.save', args=[meal_ids[i // 2 % len(meal_ids)]])),
+            'planner': lambda i: client.get(reverse('recipes.planner')),
+            'shopping_list': lambda i: client.get(reverse('recipes.shopping_list')),
+            'admin_dashboard': lambda i: client.get(reverse('accounts.admin_dashboard')),
+        }[view]
+
+        latencies, queries, upstream, errors = [], [], [], 0
+        for i in range(-1, options['requests']):
+            if options['cold']:
+                cache.clear()
+                recipe_cache.clear()
+            calls = standin.total_calls()
+            connection.queries_log.clear()  # the log is capped; seeding may have filled it
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = requests(i)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if i < 0:
+                continue  # warm-up
+            latencies.append(elapsed)
+            queries.append(len(captured))
+            upstream.append(standin.total_calls() - calls)
+            errors += response.status_code >= 400
+        return sorted(latencies), queries, upstream, errors
+
+    def report(self, dataset, view, results):
+        latencies, queries, upstream, errors = results
+        ms = [latency * 1000 for latency in latencies]
+        self.stdout.write(
+            f'{dataset:<8}{view:<16}{percentile(ms, 50):>8.1f}{percentile(ms, 90):>8.1f}'
+            f'{percentile(ms, 99):>8.1f}{ms[-1]:>8.1f}{sum(queries) / len(queries):>9.1f}'
+            f'{max(queries):>7}{sum(upstream) / len(upstream):>10.2f}{errors:>8}'
+        )
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Meal
+from recipes.standin import MealDBStandIn, load_fixture, synthetic_meals
+
+
+class Command(BaseCommand):
+    help = ('Run a local TheMealDB stand-in until interrupted. Point MEALDB_BASE_URL at the '
+            'printed URL to use it instead of themealdb.com.')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--fixture',
+                            help='JSON file of lookup.php payloads to serve.')
+        source.add_argument('--from-catalog', action='store_true',
+                            help='Serve the meals of the local catalog mirror.')
+        parser.add_argument('--count', type=int, default=300,
+                            help='Synthetic meals to serve when no other source is given.')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds to wait before answering each call.')
+        parser.add_argument('--jitter', type=float, default=0.0,
+                            help='Up to this many extra seconds of random latency per call.')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of calls (0..1) to fail with --error-status.')
+        parser.add_argument('--error-status', type=int, default=503)
+
+    def handle(self, *args, **options):
+        if options['fixture']:
+            meals = load_fixture(options['fixture'])
+        elif options['from_catalog']:
+            meals = list(Meal.objects.values_list('data', flat=True))
+        else:
+            meals = synthetic_meals(options['count'])
+        if not meals:
+            raise CommandError('No meals to serve.')
+
+        standin = MealDBStandIn(
+            meals, latency=options['latency'], host=options['host'], port=options['port'],
+            jitter=options['jitter'], error_rate=options['error_rate'],
+            error_status=options['error_status'],
+        ).start()
+        self.stdout.write(self.style.SUCCESS(f'Serving {len(meals)} meals at {standin.base_url}'))
+        self.stdout.write(f'MEALDB_BASE_URL={standin.base_url}')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            standin.stop()
+            calls = ', '.join(f'{endpoint}: {count}' for endpoint, count in sorted(standin.calls.items()))
+            self.stdout.write(f'Calls served: {calls or "none"}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the local full-text recipe search index from the stored recipes.'
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        if indexed is None:
+            raise CommandError('Full-text search needs SQLite with FTS5; searches fall back to icontains.')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} recipes.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ratings import recompute_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-recipe rating summaries from the Rating table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recipe_ids',
+            nargs='*',
+            type=int,
+            help='Only rebuild these recipes (default: all).',
+        )
+
+    def handle(self, *args, **options):
+        written = recompute_summaries(options['recipe_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rating summaries.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import catalog
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the category x area facet table from the local catalog.'
+
+    def handle(self, *args, **options):
+        facets = catalog.refresh_facets()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {facets} category/area facets.'))
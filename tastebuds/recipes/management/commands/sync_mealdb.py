@@ -0,0 +1,132 @@
+import json
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import catalog
+from recipes.mealdb import client
+from recipes.models import Meal
+
+
+class Command(BaseCommand):
+    help = 'Mirror the TheMealDB catalog (categories, areas, recipes) into the local database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Read recipes from a local JSON dump instead of TheMealDB. '
+                 'Accepts a list of lookup.php payloads or an object with '
+                 '"meals" and optional "categories"/"areas" lists.',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Refetch recipes that are already stored locally.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after storing this many recipes (useful for a quick partial sync).',
+        )
+        parser.add_argument(
+            '--complete',
+            action='store_true',
+            help='With --source: the dump holds every recipe of its categories and areas, '
+                 'so lists of them may be answered from the local catalog.',
+        )
+
+    def handle(self, *args, **options):
+        if options['source']:
+            stored = self.sync_from_dump(options['source'], options['limit'], options['complete'])
+        else:
+            stored = self.sync_from_api(options['full'], options['limit'])
+        facets = catalog.refresh_facets()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} recipes ({Meal.objects.count()} in local catalog, {facets} facets).'
+        ))
+
+    def sync_from_dump(self, path, limit, complete):
+        try:
+            with open(path, encoding='utf-8') as dump:
+                data = json.load(dump)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read {path}: {exc}')
+
+        if isinstance(data, list):
+            data = {'meals': data}
+
+        catalog.store_categories(data.get('categories') or [])
+        catalog.store_areas(data.get('areas') or [])
+
+        stored = 0
+        for meal in data.get('meals') or []:
+            if limit is not None and stored >= limit:
+                return stored
+            if meal and meal.get('idMeal'):
+                catalog.store_meal(meal)
+                stored += 1
+
+        if complete:
+            meals = [meal for meal in data.get('meals') or [] if meal]
+            for name in {meal.get('strCategory') for meal in meals} - {None, ''}:
+                catalog.mark_category_synced(name)
+            for name in {meal.get('strArea') for meal in meals} - {None, ''}:
+                catalog.mark_area_synced(name)
+        return stored
+
+    def list_names(self, kind, key):
+        meals = self.get_json('list.php', {kind: 'list'}).get('meals') or []
+        return [entry[key] for entry in meals if entry.get(key)]
+
+    def get_json(self, endpoint, params):
+        try:
+            return client.get_json(endpoint, **params)
+        except (requests.RequestException, ValueError) as exc:
+            raise CommandError(f'{endpoint} {params} failed: {exc}')
+
+    def sync_from_api(self, full, limit):
+        categories = self.list_names('c', 'strCategory')
+        areas = self.list_names('a', 'strArea')
+        catalog.store_categories(categories)
+        catalog.store_areas(areas)
+
+        self.known_ids = set() if full else set(Meal.objects.values_list('id', flat=True))
+        self.stored = 0
+        self.limit = limit
+        # A category or area is marked synced once all of its recipes are
+        # stored, so lists of it can be answered locally
+        for kind, names, mark_synced in (('c', categories, catalog.mark_category_synced),
+                                         ('a', areas, catalog.mark_area_synced)):
+            for name in names:
+                meals = self.get_json('filter.php', {kind: name}).get('meals') or []
+                complete = self.store_missing(name, [int(m['idMeal']) for m in meals])
+                if complete is None:
+                    return self.stored  # limit reached
+                if complete:
+                    mark_synced(name)
+        return self.stored
+
+    def store_missing(self, name, meal_ids):
+        """Fetch and store the ids not stored yet. Returns whether all of
+        them are now stored, or None once the limit is reached."""
+        missing = [meal_id for meal_id in meal_ids if meal_id not in self.known_ids]
+        self.stdout.write(f'{name}: {len(meal_ids)} recipes, {len(missing)} to fetch')
+
+        complete = True
+        for meal_id in missing:
+            if self.limit is not None and self.stored >= self.limit:
+                return None
+            try:
+                meal = catalog.fetch_meal(meal_id)
+            except (requests.RequestException, ValueError) as exc:
+                self.stderr.write(f'lookup.php?i={meal_id} failed: {exc}')
+                complete = False
+                continue
+            if meal:
+                catalog.store_meal(meal)
+                self.known_ids.add(meal_id)
+                self.stored += 1
+            else:
+                complete = False
+        return complete
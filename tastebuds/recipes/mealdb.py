@@ -0,0 +1,226 @@
+"""Shared HTTP client for TheMealDB.
+
+All upstream calls go through ``client`` so they reuse one keep-alive
+connection pool instead of paying for a new TCP+TLS handshake each time.
+The async views use ``async_client``, which does the same with aiohttp.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+from .metrics import timed_upstream
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # async_client falls back to running the sync client in threads
+
+
+class MealDBClient:
+    """Thin wrapper around a pooled ``requests.Session`` for TheMealDB."""
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None):
+        base_url = base_url or settings.MEALDB_BASE_URL
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.pool_size = pool_size or settings.MEALDB_POOL_SIZE
+        self.timeout = (
+            connect_timeout or settings.MEALDB_CONNECT_TIMEOUT,
+            read_timeout or settings.MEALDB_READ_TIMEOUT,
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_json(self, endpoint, **params):
+        """GET an endpoint (e.g. 'filter.php') and return the decoded body.
+
+        Raises ``requests.RequestException`` or ``ValueError`` on failure.
+        """
+        with timed_upstream():
+            response = self.session.get(self.base_url + endpoint, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def meals(self, endpoint, **params):
+        """Return the 'meals' list of an endpoint, empty when there is none."""
+        return self.get_json(endpoint, **params).get('meals') or []
+
+    def lookup(self, meal_id):
+        """Return the lookup.php payload of a recipe, or None if it does not exist."""
+        meals = self.meals('lookup.php', i=meal_id)
+        return meals[0] if meals else None
+
+    def fetch(self, url, max_bytes=None):
+        """GET an absolute URL (e.g. a recipe image) and return the body.
+
+        Raises ``requests.RequestException`` on failure and ``ValueError``
+        if the body is larger than ``max_bytes``.
+        """
+        with timed_upstream(), self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            body = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                body += chunk
+                if max_bytes and len(body) > max_bytes:
+                    raise ValueError(f'{url} is larger than {max_bytes} bytes')
+        return bytes(body)
+
+    def close(self):
+        self.session.close()
+
+
+client = SimpleLazyObject(MealDBClient)
+
+
+class AsyncMealDBClient:
+    """Async counterpart of ``MealDBClient`` built on ``aiohttp``.
+
+    aiohttp sessions are bound to the event loop they were created on, so
+    one pooled session is kept per running loop. Without aiohttp installed
+    the calls are delegated to the sync ``client`` in a worker thread.
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None):
+        base_url = base_url or settings.MEALDB_BASE_URL
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.pool_size = pool_size or settings.MEALDB_POOL_SIZE
+        self.connect_timeout = connect_timeout or settings.MEALDB_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.MEALDB_READ_TIMEOUT
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def _session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(connect=self.connect_timeout,
+                                              sock_read=self.read_timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def get_json(self, endpoint, **params):
+        """GET an endpoint and return the decoded body; raises on failure."""
+        if aiohttp is None:
+            return await asyncio.to_thread(client.get_json, endpoint, **params)
+        with timed_upstream():
+            async with self._session().get(self.base_url + endpoint, params=params) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def meals(self, endpoint, **params):
+        return (await self.get_json(endpoint, **params)).get('meals') or []
+
+    async def lookup(self, meal_id):
+        meals = await self.meals('lookup.php', i=meal_id)
+        return meals[0] if meals else None
+
+    async def close(self):
+        """Close the session of the running loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+async_client = SimpleLazyObject(AsyncMealDBClient)
+
+
+def reset_clients():
+    """Rebuild the shared clients from settings on next use (e.g. after
+    MEALDB_BASE_URL was overridden)."""
+    if client._wrapped is not empty:
+        client.close()
+    client._wrapped = empty
+    async_client._wrapped = empty
+
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _get_pool(name, max_workers):
+    with _executor_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return _executors[name]
+
+
+def get_executor():
+    """Return the thread pool for upstream calls a request waits for
+    (``fan_out``)."""
+    return _get_pool('mealdb', settings.MEALDB_MAX_WORKERS)
+
+
+def get_background_executor():
+    """Return the thread pool for work no request waits for (cache
+    refreshes, ingredient enrichment). It is separate so that calls
+    abandoned by ``fan_out`` can't delay it, and it can't starve requests."""
+    return _get_pool('mealdb-background', settings.MEALDB_BACKGROUND_WORKERS)
+
+
+def fan_out(fn, items, deadline):
+    """Call ``fn(item)`` for every item concurrently until ``deadline``.
+
+    ``deadline`` is a ``time.monotonic()`` timestamp. Returns a tuple
+    ``(results, failed)`` where ``results`` maps each item to its return
+    value and ``failed`` lists the items that raised or had not finished by
+    the deadline. Calls still running at the deadline are abandoned, not
+    waited for. Each call runs in a copy of the caller's context, so its
+    upstream time is counted towards the current request.
+    """
+    executor = get_executor()
+    futures = {executor.submit(contextvars.copy_context().run, fn, item): item for item in items}
+    done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+
+    for future in not_done:
+        future.cancel()
+
+    results = {}
+    failed = [futures[future] for future in not_done]
+    for future in done:
+        if future.exception() is None:
+            results[futures[future]] = future.result()
+        else:
+            failed.append(futures[future])
+    return results, failed
+
+
+async def afan_out(fn, items, deadline):
+    """Async counterpart of ``fan_out`` for coroutine functions.
+
+    At most MEALDB_MAX_WORKERS calls are in flight at once; calls still
+    pending at the deadline are cancelled.
+    """
+    semaphore = asyncio.Semaphore(settings.MEALDB_MAX_WORKERS)
+
+    async def run(item):
+        async with semaphore:
+            return await fn(item)
+
+    tasks = {asyncio.ensure_future(run(item)): item for item in items}
+    if not tasks:
+        return {}, []
+    done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    failed = [tasks[task] for task in pending]
+    for task in done:
+        if task.exception() is None:
+            results[tasks[task]] = task.result()
+        else:
+            failed.append(tasks[task])
+    return results, failed
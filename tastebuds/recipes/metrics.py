@@ -0,0 +1,276 @@
+"""Per-request timing of TheMealDB calls, database queries and template
+rendering.
+
+``MetricsMiddleware`` times a sampled request's upstream calls (reported
+by ``recipes.mealdb`` through ``timed_upstream``), its ORM queries (through
+an execute wrapper every connection gets when it is opened) and its
+template renders (through the ``DjangoTemplates`` backend below). It adds
+the totals to per-view histograms, which ``metrics_view`` serves at
+/metrics in the Prometheus text format, and sends them back in a
+``Server-Timing`` header to the same staff or METRICS_ALLOWED_IPS clients.
+It runs in sync and async stacks alike; the context variable follows the
+request into ``sync_to_async`` threads.
+
+Requests that are not sampled (see METRICS_SAMPLE_RATE) cost one random
+number; the hooks only look up a context variable. Histograms are kept per
+process, so with several workers each reports its own.
+"""
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.template.backends import django as django_backend
+
+_current = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestMetrics:
+    """Totals of one request. Upstream calls may be made from worker
+    threads (see ``mealdb.fan_out``), hence the lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.upstream_time = 0.0
+        self.upstream_calls = 0
+        self.template_time = 0.0
+
+    def time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.db_time += elapsed
+                self.db_queries += 1
+
+    def add_upstream(self, elapsed):
+        with self.lock:
+            self.upstream_time += elapsed
+            self.upstream_calls += 1
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'upstream;dur={self.upstream_time * 1000:.1f};desc="{self.upstream_calls} calls"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.time_query(execute, sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver: time the connection's queries
+    whenever it runs them for a sampled request."""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@contextmanager
+def timed_upstream():
+    """Count the enclosed TheMealDB call towards the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_upstream(time.perf_counter() - started)
+
+
+class Histogram:
+    """Prometheus histogram with one series per view."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # view -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                series = self._series[view] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {view: list(values) for view, values in self._series.items()}
+        for view, values in sorted(series.items()):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {values[-1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('tastebuds_request_duration_seconds',
+                             'Time spent handling a request.', DURATION_BUCKETS)
+DB_DURATION = Histogram('tastebuds_db_duration_seconds',
+                        'Time spent in database queries per request.', DURATION_BUCKETS)
+DB_QUERIES = Histogram('tastebuds_db_queries',
+                       'Database queries per request.', COUNT_BUCKETS)
+UPSTREAM_DURATION = Histogram('tastebuds_upstream_duration_seconds',
+                              'Time spent in TheMealDB calls per request (summed over concurrent calls).',
+                              DURATION_BUCKETS)
+UPSTREAM_CALLS = Histogram('tastebuds_upstream_calls',
+                           'TheMealDB calls per request.', COUNT_BUCKETS)
+TEMPLATE_DURATION = Histogram('tastebuds_template_duration_seconds',
+                              'Time spent rendering templates per request.', DURATION_BUCKETS)
+
+HISTOGRAMS = [REQUEST_DURATION, DB_DURATION, DB_QUERIES, UPSTREAM_DURATION, UPSTREAM_CALLS, TEMPLATE_DURATION]
+
+
+def observe(view, total, metrics):
+    REQUEST_DURATION.observe(view, total)
+    DB_DURATION.observe(view, metrics.db_time)
+    DB_QUERIES.observe(view, metrics.db_queries)
+    UPSTREAM_DURATION.observe(view, metrics.upstream_time)
+    UPSTREAM_CALLS.observe(view, metrics.upstream_calls)
+    TEMPLATE_DURATION.observe(view, metrics.template_time)
+
+
+def _allowed_ip(request):
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def allowed(request):
+    """Whether the client may see metrics: staff, or METRICS_ALLOWED_IPS."""
+    if _allowed_ip(request):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and (user.is_staff or user.is_superuser)
+
+
+async def aallowed(request):
+    """Async counterpart of ``allowed``."""
+    if _allowed_ip(request):
+        return True
+    if not hasattr(request, 'auser'):
+        return False
+    user = await request.auser()
+    return user.is_staff or user.is_superuser
+
+
+class MetricsMiddleware:
+    """Time sampled requests; put first in MIDDLEWARE so the session and
+    auth queries are counted too."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _finish(self, request, metrics, started):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        observe(match.view_name if match else 'unresolved', total, metrics)
+        return metrics.server_timing(total)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        server_timing = self._finish(request, metrics, started)
+        if allowed(request):
+            response['Server-Timing'] = server_timing
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        server_timing = self._finish(request, metrics, started)
+        if await aallowed(request):
+            response['Server-Timing'] = server_timing
+        return response
+
+
+class TimedTemplate:
+    """Wraps a backend template to add its render time to the request."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with top-level renders timed per request
+    (includes and extends are part of their parent's render)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the per-view histograms; staff or
+    METRICS_ALLOWED_IPS only."""
+    if not allowed(request):
+        raise PermissionDenied("You do not have permission to access this page.")
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.exposition())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
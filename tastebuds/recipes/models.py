@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Case, Value, When
 from django.contrib.auth.models import User
 
 
@@ -14,17 +15,48 @@ class Rating(models.Model):
     class Meta:
         unique_together = ['user', 'recipe_id']
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a recipe's reviews on (created_at, id)
+            models.Index(fields=['recipe_id', '-created_at', '-id'], name='rating_recipe_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - Recipe {self.recipe_id} - {self.rating} stars"
 
 
+class RatingSummary(models.Model):
+    """Per-recipe rating totals, kept in sync with Rating rows (see recipes.ratings)."""
+    recipe_id = models.IntegerField(primary_key=True, help_text="The idMeal from TheMealDB API")
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0, help_text="Sum of all star ratings")
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        """Average rating rounded to one decimal, or None without ratings."""
+        return round(self.total / self.count, 1) if self.count else None
+
+    @property
+    def histogram(self):
+        """Number of ratings per star, from 1 to 5."""
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+    def __str__(self):
+        return f"Recipe {self.recipe_id} - {self.average} ({self.count} ratings)"
+
+
 class SavedRecipe(models.Model):
     """Model to store recipes saved by users."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_recipes')
     recipe_id = models.CharField(max_length=100)  # TheMealDB recipe ID
     recipe_name = models.CharField(max_length=200)
     recipe_image = models.URLField(blank=True, null=True)
+    ingredients_synced = models.BooleanField(default=False, help_text="Whether the ingredients rows have been stored")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -35,24 +67,66 @@ class SavedRecipe(models.Model):
         return f"{self.user.username} - {self.recipe_name}"
 
 
+class SavedRecipeIngredient(models.Model):
+    """Model to store the ingredients of a saved recipe, parsed when it is saved."""
+    saved_recipe = models.ForeignKey(SavedRecipe, on_delete=models.CASCADE, related_name='ingredients')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=200)
+    measure = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        unique_together = ['saved_recipe', 'position']
+        ordering = ['saved_recipe', 'position']
+
+    def __str__(self):
+        return f"{self.saved_recipe.recipe_name} - {self.measure} {self.name}".strip()
+
+
+class SavedIngredientCount(models.Model):
+    """Per-user aggregate of the saved recipes' ingredients: how many saved
+    recipes use each ingredient name, kept in step by recipes.shopping."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_ingredient_counts')
+    name = models.CharField(max_length=200)
+    recipes = models.IntegerField(default=0, help_text="Saved recipes using this ingredient")
+
+    class Meta:
+        unique_together = ['user', 'name']
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.name} ({self.recipes})"
+
+
+DAYS_OF_WEEK = [
+    ('Monday', 'Monday'),
+    ('Tuesday', 'Tuesday'),
+    ('Wednesday', 'Wednesday'),
+    ('Thursday', 'Thursday'),
+    ('Friday', 'Friday'),
+    ('Saturday', 'Saturday'),
+    ('Sunday', 'Sunday'),
+]
+
+MEAL_SLOTS = [
+    ('Breakfast', 'Breakfast'),
+    ('Lunch', 'Lunch'),
+    ('Dinner', 'Dinner'),
+    ('Snack', 'Snack'),
+]
+
+
+def choice_order(field, choices):
+    """Order by a field's position in its choices instead of alphabetically."""
+    return Case(
+        *[When(**{field: value}, then=Value(position)) for position, (value, _) in enumerate(choices)],
+        output_field=models.IntegerField(),
+    )
+
+
 class WeeklyMealPlan(models.Model):
     """Model to store recipes assigned to specific day and meal slots."""
-    DAYS_OF_WEEK = [
-        ('Monday', 'Monday'),
-        ('Tuesday', 'Tuesday'),
-        ('Wednesday', 'Wednesday'),
-        ('Thursday', 'Thursday'),
-        ('Friday', 'Friday'),
-        ('Saturday', 'Saturday'),
-        ('Sunday', 'Sunday'),
-    ]
-
-    MEAL_SLOTS = [
-        ('Breakfast', 'Breakfast'),
-        ('Lunch', 'Lunch'),
-        ('Dinner', 'Dinner'),
-        ('Snack', 'Snack'),
-    ]
+    DAYS_OF_WEEK = DAYS_OF_WEEK
+    MEAL_SLOTS = MEAL_SLOTS
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_plans')
     saved_recipe = models.ForeignKey(SavedRecipe, on_delete=models.CASCADE, related_name='meal_plans')
@@ -62,7 +136,11 @@ class WeeklyMealPlan(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['day', 'meal_slot', 'created_at']
+        # Monday..Sunday and Breakfast..Snack, not alphabetical
+        ordering = [choice_order('day', DAYS_OF_WEEK), choice_order('meal_slot', MEAL_SLOTS), 'created_at']
+        indexes = [
+            models.Index(fields=['user', 'day', 'meal_slot'], name='mealplan_user_slot_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.day} {self.meal_slot}: {self.saved_recipe.recipe_name}"
@@ -79,4 +157,81 @@ class ShoppingItem(models.Model):
         ordering = ['name']
 
     def __str__(self):
-        return f"{self.user.username} - {self.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.name}"
+
+class MealCategory(models.Model):
+    """Model to store the TheMealDB categories (list.php?c=list)."""
+    name = models.CharField(max_length=100, unique=True)
+    synced_at = models.DateTimeField(null=True, blank=True,
+                                     help_text="When sync_mealdb last stored every recipe of the category")
+    listed = models.BooleanField(default=False, help_text="Named by list.php, i.e. a known category even with no stored recipes")
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class MealArea(models.Model):
+    """Model to store the TheMealDB areas/regions (list.php?a=list)."""
+    name = models.CharField(max_length=100, unique=True)
+    synced_at = models.DateTimeField(null=True, blank=True,
+                                     help_text="When sync_mealdb last stored every recipe of the area")
+    listed = models.BooleanField(default=False, help_text="Named by list.php, i.e. a known area even with no stored recipes")
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Meal(models.Model):
+    """Local mirror of a TheMealDB recipe (lookup.php payload)."""
+    id = models.IntegerField(primary_key=True, help_text="The idMeal from TheMealDB API")
+    name = models.CharField(max_length=200, db_index=True)
+    category = models.ForeignKey(MealCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='meals')
+    area = models.ForeignKey(MealArea, on_delete=models.SET_NULL, null=True, blank=True, related_name='meals')
+    thumbnail = models.URLField(blank=True)
+    tags = models.CharField(max_length=200, blank=True)
+    data = models.JSONField(help_text="Raw lookup.php payload")
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class MealIngredient(models.Model):
+    """Model to store the parsed ingredient/measure pairs of a mirrored recipe."""
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='ingredients')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=200, db_index=True)
+    measure = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        unique_together = ['meal', 'position']
+        ordering = ['meal', 'position']
+
+    def __str__(self):
+        return f"{self.meal.name} - {self.measure} {self.name}".strip()
+
+
+class MealFacet(models.Model):
+    """Precomputed category x area facet: the ids of the mirrored recipes in
+    both, ordered by name. Only built for pairs whose category or area is
+    fully mirrored. Rebuilt by the refresh_facets command."""
+    category = models.ForeignKey(MealCategory, on_delete=models.CASCADE, related_name='facets')
+    area = models.ForeignKey(MealArea, on_delete=models.CASCADE, related_name='facets')
+    meal_ids = models.JSONField(default=list)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['category', 'area']
+
+    def __str__(self):
+        return f"{self.category.name} / {self.area.name} ({self.count})"
@@ -0,0 +1,281 @@
+""""Cook with what I have": rank recipes by how many of their ingredients a
+user already has.
+
+``IngredientIndex`` is an in-memory inverted index over the local catalog:
+every ingredient name maps to a sorted ``array`` of dense recipe positions,
+so a query only touches the posting lists of the ingredients asked for. It
+is built from the ``MealIngredient`` table once per process, in the
+background from the first request on (see ``warm``), and swapped in when
+complete; ``catalog.store_meal`` then updates it one recipe at a time.
+Recipes stored by other processes (``sync_mealdb``, other workers) are
+picked up by their ``Meal.synced_at``: at most every
+PANTRY_INDEX_REFRESH_INTERVAL seconds a query starts a background
+``refresh``.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.db.models import Max
+
+from .mealdb import get_background_executor
+from .models import Meal, MealIngredient
+
+
+def normalize(name):
+    """Canonical form of an ingredient name ('  Olive  oil' -> 'olive oil')."""
+    return ' '.join(name.lower().split())
+
+
+def _variants(term):
+    """Singular/plural spellings to try when a term is not known as is."""
+    if term.endswith('es'):
+        yield term[:-2]
+    if term.endswith('s'):
+        yield term[:-1]
+    else:
+        yield term + 's'
+        yield term + 'es'
+
+
+class IngredientIndex:
+    """Inverted index from ingredient to the recipes that use it.
+
+    Queries and single-recipe updates take ``lock``, so an update never
+    shows a query a half-changed recipe.
+    """
+
+    def __init__(self, meals, ingredients):
+        """``meals`` is an iterable of (id, name, thumbnail) and
+        ``ingredients`` one of (meal_id, ingredient name), both ordered by
+        meal id so the posting lists come out sorted."""
+        self.lock = threading.Lock()
+        self.synced_at = None  # latest Meal.synced_at indexed, if built from the catalog
+        self.checked_at = time.monotonic()  # last check for recipes stored elsewhere
+        self.meals = []  # position -> (id, name, thumbnail)
+        self.positions = {}  # meal id -> position
+        for meal in meals:
+            self.positions[meal[0]] = len(self.meals)
+            self.meals.append(meal)
+
+        self.names = []  # term id -> display name
+        self.terms = {}  # normalized name -> term id
+        self.postings = []  # term id -> array of recipe positions
+        self.recipe_terms = [array('I') for _ in self.meals]  # position -> term ids
+
+        for meal_id, name in ingredients:
+            position = self.positions.get(meal_id)
+            term_id = self._add_term(name)
+            if position is None or term_id is None:
+                continue
+            if term_id not in self.recipe_terms[position]:
+                self.recipe_terms[position].append(term_id)
+                self.postings[term_id].append(position)
+
+    def _add_term(self, name):
+        """Return the term id of an ingredient name, adding it if new
+        (None for a blank name)."""
+        term = normalize(name)
+        if not term:
+            return None
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = self.terms[term] = len(self.names)
+            self.names.append(name.strip())
+            self.postings.append(array('I'))
+        return term_id
+
+    @classmethod
+    def build(cls):
+        """Build the index from the local catalog (three queries)."""
+        # Taken first: a recipe stored during the build is refreshed again
+        synced_at = Meal.objects.aggregate(synced_at=Max('synced_at'))['synced_at']
+        index = cls(
+            Meal.objects.values_list('id', 'name', 'thumbnail').order_by('id'),
+            MealIngredient.objects.values_list('meal_id', 'name').order_by('meal_id', 'position').iterator(),
+        )
+        index.synced_at = synced_at
+        return index
+
+    def refresh(self):
+        """Update the recipes stored since the index was built or last
+        refreshed. Returns False if recipes were deleted meanwhile, which
+        takes a rebuild."""
+        meals = Meal.objects.values_list('id', 'name', 'thumbnail', 'synced_at').order_by('id')
+        if self.synced_at is not None:
+            meals = meals.filter(synced_at__gte=self.synced_at)
+        meals = list(meals)
+        ingredients = {}
+        for meal_id, name in (MealIngredient.objects.filter(meal_id__in=[meal[0] for meal in meals])
+                              .values_list('meal_id', 'name').order_by('meal_id', 'position')):
+            ingredients.setdefault(meal_id, []).append(name)
+        for meal_id, name, thumbnail, synced_at in meals:
+            self.update_meal(meal_id, name, thumbnail, ingredients.get(meal_id, []))
+            if self.synced_at is None or synced_at > self.synced_at:
+                self.synced_at = synced_at
+        return Meal.objects.count() == len(self)
+
+    def __len__(self):
+        return len(self.meals)
+
+    def update_meal(self, meal_id, name, thumbnail, ingredients):
+        """Add a recipe, or replace the summary and ingredient names of one
+        already indexed."""
+        with self.lock:
+            position = self.positions.get(meal_id)
+            if position is None:
+                position = self.positions[meal_id] = len(self.meals)
+                self.meals.append(None)
+                self.recipe_terms.append(array('I'))
+            self.meals[position] = (meal_id, name, thumbnail)
+
+            terms = array('I')
+            for ingredient in ingredients:
+                term_id = self._add_term(ingredient)
+                if term_id is not None and term_id not in terms:
+                    terms.append(term_id)
+
+            old, new = set(self.recipe_terms[position]), set(terms)
+            for term_id in old - new:
+                postings = self.postings[term_id]
+                postings.pop(bisect_left(postings, position))
+            for term_id in new - old:
+                insort(self.postings[term_id], position)
+            self.recipe_terms[position] = terms
+
+    def term_id(self, name):
+        """Return the term id of an ingredient name, or None if unknown."""
+        term = normalize(name)
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = next((self.terms[v] for v in _variants(term) if v in self.terms), None)
+        return term_id
+
+    def match(self, ingredients, limit=20):
+        """Rank recipes by how much of their ingredient list is covered.
+
+        Returns ``(results, unknown)``: up to ``limit`` dicts with the
+        recipe summary, its ``matched`` and ``missing`` ingredient names and
+        ``coverage`` (0-1), best first; and the names that are not an
+        ingredient of any recipe. Ties go to the recipe with fewer missing
+        ingredients.
+        """
+        with self.lock:
+            wanted = set()
+            unknown = []
+            for name in ingredients:
+                term_id = self.term_id(name)
+                if term_id is None or not self.postings[term_id]:  # (no longer) used by any recipe
+                    unknown.append(name)
+                else:
+                    wanted.add(term_id)
+
+            counts = Counter()
+            for term_id in wanted:
+                counts.update(self.postings[term_id])
+
+            def rank(item):
+                position, matched = item
+                total = len(self.recipe_terms[position])
+                return (-matched / total, total - matched, position)
+
+            results = []
+            for position, matched in heapq.nsmallest(limit, counts.items(), key=rank):
+                meal_id, name, thumbnail = self.meals[position]
+                terms = self.recipe_terms[position]
+                results.append({
+                    'idMeal': str(meal_id),
+                    'strMeal': name,
+                    'strMealThumb': thumbnail,
+                    'matched': [self.names[t] for t in terms if t in wanted],
+                    'missing': [self.names[t] for t in terms if t not in wanted],
+                    'coverage': round(matched / len(terms), 3),
+                })
+        return results, unknown
+
+
+_index = None
+_pending = None  # recipes stored while a build runs, applied before it is swapped in
+_lock = threading.Lock()  # guards _index and _pending
+_build_lock = threading.Lock()  # one build at a time
+
+
+def get_index():
+    """Return the shared ingredient index. Only queries that come before
+    the first build has finished wait for it; later ones at most start a
+    background refresh."""
+    index = _index
+    if index is None:
+        with _build_lock:
+            index = _index if _index is not None else _build()
+    else:
+        with _lock:
+            due = time.monotonic() - index.checked_at >= settings.PANTRY_INDEX_REFRESH_INTERVAL
+            if due:
+                index.checked_at = time.monotonic()
+        if due:
+            get_background_executor().submit(_refresh, index)
+    return index
+
+
+def _build():
+    global _index, _pending
+    with _lock:
+        _pending = []
+    try:
+        index = IngredientIndex.build()
+        with _lock:
+            for meal in _pending:
+                index.update_meal(*meal)
+            _index = index
+        return index
+    finally:
+        with _lock:
+            _pending = None
+
+
+def warm(**kwargs):
+    """Build the shared index in the background unless it is built.
+
+    Connected to ``request_started`` until the first request, so the build
+    overlaps the first requests instead of waiting for a pantry query.
+    """
+    request_started.disconnect(warm)
+    if _index is None:
+        get_background_executor().submit(_warm)
+
+
+def _warm():
+    try:
+        get_index()
+    except Exception:
+        pass  # the first query builds it instead
+    finally:
+        close_old_connections()
+
+
+def _refresh(index):
+    try:
+        if not index.refresh():
+            with _build_lock:
+                _build()
+    except Exception:
+        pass  # the next check tries again
+    finally:
+        close_old_connections()
+
+
+def update_meal(meal_id, name, thumbnail, ingredients):
+    """Add or replace one recipe in the shared index (once it exists)."""
+    with _lock:
+        if _pending is not None:
+            _pending.append((meal_id, name, thumbnail, ingredients))
+        index = _index
+    if index is not None:
+        index.update_meal(meal_id, name, thumbnail, ingredients)
@@ -0,0 +1,153 @@
+"""Batch operations on a user's weekly meal planner.
+
+``apply_operations`` takes a list of operations such as::
+
+    {"op": "add", "saved_recipe_id": 3, "day": "Monday", "meal_slot": "Lunch"}
+    {"op": "move", "meal_plan_id": 7, "day": "Tuesday", "meal_slot": "Dinner"}
+    {"op": "remove", "meal_plan_id": 8}
+    {"op": "copy_day", "from_day": "Monday", "to_day": "Tuesday"}
+    {"op": "clear_day", "day": "Monday"}
+    {"op": "clear_week"}
+
+plays them in order against an in-memory copy of the planner and writes
+the net result with one bulk delete, one bulk update and one bulk insert
+inside a single transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import versions
+from .models import SavedRecipe, WeeklyMealPlan
+
+VALID_DAYS = {day for day, _ in WeeklyMealPlan.DAYS_OF_WEEK}
+VALID_MEAL_SLOTS = {meal_slot for meal_slot, _ in WeeklyMealPlan.MEAL_SLOTS}
+
+
+class PlannerOperationError(ValueError):
+    """An operation in a batch is malformed or refers to something unknown."""
+
+    def __init__(self, index, message):
+        super().__init__(f'Operation {index}: {message}')
+        self.index = index
+
+
+def _day(operation, key, index):
+    day = operation.get(key)
+    if not isinstance(day, str) or day not in VALID_DAYS:
+        raise PlannerOperationError(index, f'invalid {key} {day!r}')
+    return day
+
+
+def _slot(operation, index):
+    day = _day(operation, 'day', index)
+    meal_slot = operation.get('meal_slot')
+    if not isinstance(meal_slot, str) or meal_slot not in VALID_MEAL_SLOTS:
+        raise PlannerOperationError(index, f'invalid meal_slot {meal_slot!r}')
+    return day, meal_slot
+
+
+def _int(operation, key, index):
+    try:
+        return int(operation[key])
+    except (KeyError, TypeError, ValueError):
+        raise PlannerOperationError(index, f'missing or invalid {key}')
+
+
+def _saved_recipe_id(operation):
+    """The operation's saved_recipe_id as a string, or None if it is no id."""
+    saved_recipe_id = operation.get('saved_recipe_id')
+    if isinstance(saved_recipe_id, (int, str)) and not isinstance(saved_recipe_id, bool):
+        return str(saved_recipe_id)
+    return None
+
+
+def apply_operations(user, operations):
+    """Apply a batch of planner operations for ``user`` atomically.
+
+    Returns ``(created, moved, removed)``: the new WeeklyMealPlan rows and
+    the number of moved and removed existing rows. Raises
+    ``PlannerOperationError`` without touching the database if any
+    operation is invalid.
+    """
+    if not isinstance(operations, list):
+        raise PlannerOperationError(0, 'operations must be a list')
+
+    plans = {plan.id: plan for plan in WeeklyMealPlan.objects.filter(user=user)}
+    saved_ids = {
+        _saved_recipe_id(operation) for operation in operations
+        if isinstance(operation, dict) and operation.get('op') == 'add'
+    }
+    saved_recipes = {
+        str(saved_recipe.id): saved_recipe
+        for saved_recipe in SavedRecipe.objects.filter(
+            user=user, id__in=[i for i in saved_ids if i is not None and i.isdecimal()])
+    }
+
+    pending = []  # unsaved WeeklyMealPlan objects to create
+    moved = set()
+    removed = set()
+
+    def live_plans():
+        return [plan for plan in plans.values() if plan.id not in removed] + pending
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise PlannerOperationError(index, 'operation must be an object')
+        op = operation.get('op')
+
+        if op == 'add':
+            day, meal_slot = _slot(operation, index)
+            saved_recipe = saved_recipes.get(_saved_recipe_id(operation))
+            if saved_recipe is None:
+                raise PlannerOperationError(index, 'saved recipe not found')
+            pending.append(WeeklyMealPlan(user=user, saved_recipe=saved_recipe, day=day, meal_slot=meal_slot))
+
+        elif op in ('move', 'remove'):
+            meal_plan_id = _int(operation, 'meal_plan_id', index)
+            plan = plans.get(meal_plan_id)
+            if plan is None or meal_plan_id in removed:
+                raise PlannerOperationError(index, 'meal plan not found')
+            if op == 'move':
+                plan.day, plan.meal_slot = _slot(operation, index)
+                moved.add(meal_plan_id)
+            else:
+                removed.add(meal_plan_id)
+
+        elif op == 'copy_day':
+            from_day = _day(operation, 'from_day', index)
+            to_day = _day(operation, 'to_day', index)
+            pending.extend(
+                WeeklyMealPlan(user=user, saved_recipe_id=plan.saved_recipe_id, day=to_day, meal_slot=plan.meal_slot)
+                for plan in live_plans() if plan.day == from_day
+            )
+
+        elif op == 'clear_day':
+            day = _day(operation, 'day', index)
+            removed.update(plan.id for plan in plans.values() if plan.day == day)
+            pending = [plan for plan in pending if plan.day != day]
+
+        elif op == 'clear_week':
+            removed.update(plans)
+            pending = []
+
+        else:
+            raise PlannerOperationError(index, f'unknown op {op!r}')
+
+    moved -= removed
+    now = timezone.now()
+    for meal_plan_id in moved:
+        plans[meal_plan_id].updated_at = now
+
+    with transaction.atomic():
+        if removed:
+            WeeklyMealPlan.objects.filter(user=user, id__in=removed).delete()
+        if moved:
+            WeeklyMealPlan.objects.bulk_update(
+                [plans[meal_plan_id] for meal_plan_id in moved],
+                ['day', 'meal_slot', 'updated_at'],
+            )
+        created = WeeklyMealPlan.objects.bulk_create(pending)
+        # bulk_create/bulk_update send no signals
+        versions.bump_user(user.id)
+
+    return created, len(moved), len(removed)
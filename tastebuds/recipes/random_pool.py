@@ -0,0 +1,105 @@
+"""Rotating pool of random recipes for the landing page.
+
+The pool holds RANDOM_POOL_SIZE recipe summaries drawn at random from the
+local catalog and is redrawn every RANDOM_POOL_REFRESH_INTERVAL seconds in
+the background, so ``sample`` never waits on TheMealDB. While the local
+catalog is smaller than the pool, each refresh also pulls up to
+RANDOM_POOL_UPSTREAM_BATCH meals from random.php and stores them.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.functional import SimpleLazyObject
+
+from . import catalog
+from .mealdb import client, fan_out, get_background_executor
+
+
+class RandomPool:
+    """In-process pool of random recipe summaries, refreshed in the background."""
+
+    def __init__(self, size, refresh_interval, upstream_batch):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.upstream_batch = upstream_batch
+
+        self._meals = []
+        self._refresh_at = 0.0
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def sample(self, n):
+        """Return up to n distinct random summaries from the pool.
+
+        An empty pool is filled from the local catalog first (one query);
+        a due pool is redrawn in the background after answering.
+        """
+        if not self._meals:
+            self.refresh(upstream=False)
+        with self._lock:
+            meals = self._meals
+            due = time.monotonic() >= self._refresh_at
+        if due:
+            self._refresh_later()
+        return random.sample(meals, min(n, len(meals)))
+
+    def refresh(self, upstream=True):
+        """Redraw the pool from the local catalog, topping it up from
+        random.php when ``upstream`` is set and the catalog is too small."""
+        meals = {meal['idMeal']: meal for meal in catalog.random_meals(self.size)}
+
+        if upstream and len(meals) < self.size:
+            wanted = min(self.size - len(meals), self.upstream_batch)
+            deadline = time.monotonic() + settings.MEALDB_PAGE_DEADLINE
+            results, _ = fan_out(lambda _: client.meals('random.php'), range(wanted), deadline)
+            for found in results.values():
+                for meal in found[:1]:
+                    if meal['idMeal'] not in meals:
+                        meals[meal['idMeal']] = catalog.summarize(catalog.store_meal(meal))
+
+        # A short pool filled locally only is due again at once, so the
+        # upstream top-up happens in the background straight away
+        full = upstream or len(meals) >= self.size
+        with self._lock:
+            self._meals = list(meals.values())
+            self._refresh_at = time.monotonic() + (self.refresh_interval if full else 0)
+            self._refreshed_at = time.time()
+
+    def _refresh_later(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            # Don't retry on every request if this refresh fails
+            self._refresh_at = time.monotonic() + self.refresh_interval
+        get_background_executor().submit(self._refresh)
+
+    def _refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # keep serving the current pool
+        finally:
+            with self._lock:
+                self._refreshing = False
+            close_old_connections()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._meals),
+                'maxsize': self.size,
+                'refreshed_at': self._refreshed_at,
+                'refreshing': self._refreshing,
+            }
+
+
+random_pool = SimpleLazyObject(lambda: RandomPool(
+    size=settings.RANDOM_POOL_SIZE,
+    refresh_interval=settings.RANDOM_POOL_REFRESH_INTERVAL,
+    upstream_batch=settings.RANDOM_POOL_UPSTREAM_BATCH,
+))
@@ -0,0 +1,113 @@
+"""Rating summaries and the paginated reviews feed.
+
+``apply_rating_change`` is called from the Rating signals in
+``recipes.signals`` so the summary moves in the same transaction as the
+rating itself; ``recompute_summaries`` rebuilds rows from scratch.
+``reviews_page`` pages through a recipe's reviews by keyset on
+(created_at, id), newest first.
+"""
+import base64
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import versions
+from .models import Rating, RatingSummary
+
+
+def apply_rating_change(recipe_id, old_rating=None, new_rating=None):
+    """Move a recipe's summary from ``old_rating`` to ``new_rating``.
+
+    Either side may be None (a created or deleted rating). Updates use F()
+    expressions so concurrent ratings of the same recipe don't lose writes.
+    A recipe without a summary row gets one recomputed from its ratings.
+    """
+    if old_rating == new_rating:
+        return
+
+    changes = {'updated_at': timezone.now()}
+    if old_rating is None:
+        changes['count'] = F('count') + 1
+    elif new_rating is None:
+        changes['count'] = F('count') - 1
+    changes['total'] = F('total') + (new_rating or 0) - (old_rating or 0)
+    if old_rating is not None:
+        changes[f'stars_{old_rating}'] = F(f'stars_{old_rating}') - 1
+    if new_rating is not None:
+        changes[f'stars_{new_rating}'] = F(f'stars_{new_rating}') + 1
+
+    with transaction.atomic():
+        if RatingSummary.objects.get_or_create(recipe_id=recipe_id)[1]:
+            # No summary yet, though the recipe may have older ratings: a
+            # delta from zero would be wrong (or break the CHECKs), so build
+            # it from the Rating table, which already includes this change
+            recompute_summaries([recipe_id])
+            return
+        RatingSummary.objects.filter(recipe_id=recipe_id).update(**changes)
+
+
+def recompute_summaries(recipe_ids=None):
+    """Rebuild summaries from the Rating table; returns the number of rows written.
+
+    With ``recipe_ids`` only those recipes are rebuilt, otherwise all of them.
+    """
+    ratings = Rating.objects.all()
+    summaries = RatingSummary.objects.all()
+    if recipe_ids is not None:
+        ratings = ratings.filter(recipe_id__in=recipe_ids)
+        summaries = summaries.filter(recipe_id__in=recipe_ids)
+
+    rows = ratings.values('recipe_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    ).order_by()
+
+    now = timezone.now()
+    with transaction.atomic():
+        changed = set(summaries.values_list('recipe_id', flat=True))
+        summaries.delete()
+        created = RatingSummary.objects.bulk_create(
+            [RatingSummary(updated_at=now, **row) for row in rows],
+            batch_size=500,
+        )
+        changed.update(summary.recipe_id for summary in created)
+        for recipe_id in changed:
+            versions.bump_recipe(recipe_id)
+    return len(created)
+
+
+def encode_cursor(rating):
+    """Opaque cursor pointing just after ``rating`` in the feed."""
+    raw = f'{rating.created_at.isoformat()}|{rating.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` for a cursor; raises ValueError if malformed."""
+    try:
+        created_at, rating_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(rating_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from exc
+
+
+def reviews_page(recipe_id, cursor=None, limit=10):
+    """Return ``(reviews, next_cursor)`` for one page of a recipe's reviews.
+
+    ``next_cursor`` is None on the last page. Raises ValueError for a
+    malformed cursor.
+    """
+    reviews = Rating.objects.filter(recipe_id=recipe_id)
+    if cursor:
+        created_at, rating_id = decode_cursor(cursor)
+        reviews = reviews.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=rating_id)
+        )
+
+    page = list(reviews.select_related('user').order_by('-created_at', '-id')[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
@@ -0,0 +1,131 @@
+"""Local full-text search over the mirrored recipe catalog.
+
+On SQLite this is an FTS5 table (``recipes_meal_fts``) keyed by the meal
+id, indexing name, category, area, tags and ingredient names, ranked with
+bm25 and matching every search word as a prefix. It is updated whenever
+``catalog.store_meal`` writes a recipe and can be rebuilt from the stored
+payloads with the rebuild_search_index command. Other databases (or SQLite
+builds without FTS5) fall back to a plain ``icontains`` search.
+
+The table is not a Django model; it is created after ``migrate`` (see
+``create_index``) or on first use.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction
+from django.db.models import Q
+
+from .models import Meal
+
+FTS_TABLE = 'recipes_meal_fts'
+# Column weights for bm25(): name, category, area, tags, ingredients
+FTS_WEIGHTS = (10.0, 4.0, 4.0, 2.0, 1.0)
+
+_ready = {}
+
+
+def ensure_index(using=DEFAULT_DB_ALIAS):
+    """Create the FTS5 table if needed; return False if FTS5 is unavailable."""
+    connection = connections[using]
+    name = str(connection.settings_dict['NAME'])
+    if name not in _ready:
+        if connection.vendor != 'sqlite':
+            _ready[name] = False
+        else:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                        'name, category, area, tags, ingredients, '
+                        "tokenize='unicode61 remove_diacritics 2')"
+                    )
+                _ready[name] = True
+            except DatabaseError:
+                _ready[name] = False
+    return _ready[name]
+
+
+def create_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_migrate`` receiver: check for the FTS5 table again, as the
+    database may have been recreated under the same name (e.g. a test
+    database)."""
+    _ready.pop(str(connections[using].settings_dict['NAME']), None)
+    ensure_index(using)
+
+
+def _document(payload):
+    """Return the indexed columns of a lookup.php payload."""
+    ingredients = ' '.join(
+        payload.get(f'strIngredient{i}').strip()
+        for i in range(1, 21) if (payload.get(f'strIngredient{i}') or '').strip()
+    )
+    return (
+        payload.get('strMeal') or '',
+        payload.get('strCategory') or '',
+        payload.get('strArea') or '',
+        (payload.get('strTags') or '').replace(',', ' '),
+        ingredients,
+    )
+
+
+def index_meal(payload):
+    """Add or replace one recipe in the search index."""
+    if not ensure_index():
+        return
+    meal_id = int(payload['idMeal'])
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [meal_id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, category, area, tags, ingredients) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [meal_id, *_document(payload)],
+        )
+
+
+def rebuild():
+    """Rebuild the whole index from the stored recipe payloads.
+
+    Returns the number of indexed recipes, or None if FTS5 is unavailable.
+    """
+    if not ensure_index():
+        return None
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        for meal_id, payload in Meal.objects.values_list('id', 'data').iterator(chunk_size=500):
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, category, area, tags, ingredients) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                [meal_id, *_document(payload)],
+            )
+            indexed += 1
+    return indexed
+
+
+def _match_query(term):
+    """Turn free text into an FTS5 query: every word, as a prefix."""
+    words = re.findall(r'\w+', term.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_ids(term, limit=50):
+    """Return the ids of the best matching recipes, best first."""
+    query = _match_query(term)
+    if not query:
+        return []
+
+    if ensure_index():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}) LIMIT %s',
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    term = term.strip()
+    matches = Meal.objects.filter(
+        Q(name__icontains=term) | Q(category__name__icontains=term) | Q(area__name__icontains=term)
+        | Q(tags__icontains=term) | Q(ingredients__name__icontains=term)
+    ).order_by('name').values_list('id', flat=True).distinct()
+    return list(matches[:limit])
@@ -0,0 +1,182 @@
+"""Stored ingredients of saved recipes, the source of the shopping list.
+
+Ingredients are written once when a recipe is saved (and removed with it
+by the cascade on unsave), so the shopping list is a single query over
+SavedRecipeIngredient instead of one TheMealDB lookup per saved recipe.
+Rows saved before this existed are filled in by ``store_resolved``, either
+lazily from the shopping list or with the backfill_saved_ingredients
+command.
+
+The set of a user's ingredients is kept aggregated in
+SavedIngredientCount: ``store_resolved`` and ``forget_ingredients`` (from
+the SavedRecipe pre_delete signal) move the counts by the recipe that was
+saved or unsaved, and ``recompute_counts`` rebuilds them from scratch.
+"""
+from collections import Counter
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+
+from . import catalog, versions
+from .mealdb import get_background_executor
+from .models import SavedIngredientCount, SavedRecipe, SavedRecipeIngredient
+
+
+def _count_by_user(rows):
+    """``{user_id: Counter(name -> saved recipes)}`` of (user_id,
+    saved_recipe_id, name) rows; a name counts once per saved recipe."""
+    counts = {}
+    for user_id, _, name in set(rows):
+        counts.setdefault(user_id, Counter())[name] += 1
+    return counts
+
+
+def adjust_counts(user_id, changes):
+    """Move the user's ingredient counts by ``changes`` ({name: delta}).
+
+    Updates use F() expressions so concurrent saves don't lose writes;
+    ingredients no saved recipe uses any more are dropped.
+    """
+    by_delta = {}
+    for name, delta in changes.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(name)
+    if not by_delta:
+        return
+    with transaction.atomic():
+        SavedIngredientCount.objects.bulk_create(
+            [SavedIngredientCount(user_id=user_id, name=name) for name, delta in changes.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        counts = SavedIngredientCount.objects.filter(user_id=user_id)
+        for delta, names in by_delta.items():
+            counts.filter(name__in=names).update(recipes=F('recipes') + delta)
+        counts.filter(recipes__lte=0).delete()
+
+
+def forget_ingredients(saved_recipe):
+    """Take an unsaved recipe's ingredients out of its user's counts."""
+    names = set(SavedRecipeIngredient.objects.filter(saved_recipe=saved_recipe).values_list('name', flat=True))
+    adjust_counts(saved_recipe.user_id, dict.fromkeys(names, -1))
+
+
+def recompute_counts(user_ids=None):
+    """Rebuild the ingredient counts from SavedRecipeIngredient; returns the
+    number of rows written.
+
+    With ``user_ids`` only those users are rebuilt, otherwise all of them.
+    """
+    ingredients = SavedRecipeIngredient.objects.all()
+    counts = SavedIngredientCount.objects.all()
+    if user_ids is not None:
+        ingredients = ingredients.filter(saved_recipe__user_id__in=user_ids)
+        counts = counts.filter(user_id__in=user_ids)
+
+    rows = ingredients.values('saved_recipe__user_id', 'name').annotate(
+        recipes=Count('saved_recipe_id', distinct=True)).order_by()
+    with transaction.atomic():
+        changed = set(counts.values_list('user_id', flat=True))
+        counts.delete()
+        created = SavedIngredientCount.objects.bulk_create(
+            [SavedIngredientCount(user_id=row['saved_recipe__user_id'], name=row['name'], recipes=row['recipes'])
+             for row in rows],
+            batch_size=500,
+        )
+        changed.update(count.user_id for count in created)
+        for user_id in changed:
+            versions.bump_user(user_id)
+    return len(created)
+
+
+def store_resolved(saved_recipes, recipes):
+    """Store the ingredients of ``saved_recipes`` from their resolved payloads.
+
+    ``recipes`` maps a recipe id (string) to its TheMealDB payload, as
+    returned by ``catalog.get_meals``. Saved recipes without a payload are
+    left for later; their names are returned.
+    """
+    rows = []
+    synced_ids = []
+    unavailable = []
+    for saved_recipe in saved_recipes:
+        recipe = recipes.get(saved_recipe.recipe_id)
+        if not recipe:
+            unavailable.append(saved_recipe.recipe_name)
+            continue
+        synced_ids.append(saved_recipe.id)
+        rows.extend(
+            SavedRecipeIngredient(saved_recipe=saved_recipe, position=position,
+                                  name=item['ingredient'], measure=item['measure'])
+            for position, item in enumerate(catalog.parse_ingredients(recipe), start=1)
+        )
+
+    if synced_ids:
+        with transaction.atomic():
+            old = SavedRecipeIngredient.objects.filter(saved_recipe_id__in=synced_ids)
+            removed = _count_by_user(old.values_list('saved_recipe__user_id', 'saved_recipe_id', 'name'))
+            added = _count_by_user((row.saved_recipe.user_id, row.saved_recipe_id, row.name) for row in rows)
+            old.delete()
+            SavedRecipeIngredient.objects.bulk_create(rows, batch_size=500)
+            SavedRecipe.objects.filter(id__in=synced_ids).update(ingredients_synced=True)
+            for user_id in added.keys() | removed.keys():
+                changes = Counter(added.get(user_id))
+                changes.subtract(removed.get(user_id, Counter()))
+                adjust_counts(user_id, changes)
+            for user_id in {saved_recipe.user_id for saved_recipe in saved_recipes}:
+                versions.bump_user(user_id)
+    return unavailable
+
+
+def enrich_later(saved_recipe_ids):
+    """Resolve saved recipes in the background once the current transaction
+    commits: store their ingredients and take their name and image from
+    the recipe payload. Saved recipes that turn out not to exist are
+    removed."""
+    saved_recipe_ids = list(saved_recipe_ids)
+    transaction.on_commit(lambda: get_background_executor().submit(_enrich, saved_recipe_ids))
+
+
+def _enrich(saved_recipe_ids):
+    try:
+        saved_recipes = list(SavedRecipe.objects.filter(id__in=saved_recipe_ids, ingredients_synced=False))
+        if not saved_recipes:
+            return
+        recipes, unavailable = catalog.get_meals([saved_recipe.recipe_id for saved_recipe in saved_recipes])
+        # lookup.php found no such recipe (not merely failed or timed out)
+        missing = {meal_id for meal_id in unavailable if catalog.known_missing(meal_id)}
+        found = [saved_recipe for saved_recipe in saved_recipes if saved_recipe.recipe_id not in missing]
+        for saved_recipe in found:
+            recipe = recipes.get(saved_recipe.recipe_id)
+            if recipe:
+                saved_recipe.recipe_name = recipe.get('strMeal') or saved_recipe.recipe_name
+                saved_recipe.recipe_image = recipe.get('strMealThumb') or saved_recipe.recipe_image
+        with transaction.atomic():
+            if missing:
+                SavedRecipe.objects.filter(id__in=saved_recipe_ids, recipe_id__in=missing,
+                                           ingredients_synced=False).delete()
+            SavedRecipe.objects.bulk_update(found, ['recipe_name', 'recipe_image'])
+            store_resolved(found, recipes)
+    finally:
+        close_old_connections()
+
+
+def ingredient_names(user):
+    """Return the set of ingredient names of the user's saved recipes (one
+    query over the aggregated counts)."""
+    return set(SavedIngredientCount.objects.filter(user=user).values_list('name', flat=True))
+
+
+def ingredients_by_recipe(user):
+    """Return ``{recipe name: [ingredient, ...]}`` for the user's saved recipes.
+
+    One query joining the ingredient rows to their saved recipes.
+    """
+    rows = (SavedRecipeIngredient.objects
+            .filter(saved_recipe__user=user)
+            .order_by('-saved_recipe__created_at', 'saved_recipe_id', 'position')
+            .values_list('saved_recipe__recipe_name', 'name'))
+
+    grouped = {}
+    for recipe_name, ingredient in rows:
+        grouped.setdefault(recipe_name, []).append(ingredient)
+    return grouped
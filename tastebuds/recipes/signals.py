@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import shopping, versions
+from .models import Rating, SavedRecipe, ShoppingItem, WeeklyMealPlan
+from .ratings import apply_rating_change
+
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored values around so post_save can compute the delta."""
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Rating.objects.filter(pk=instance.pk).values_list('recipe_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Rating)
+def update_summary_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous and previous[0] != instance.recipe_id:
+        apply_rating_change(previous[0], old_rating=previous[1])
+        versions.bump_recipe(previous[0])
+        previous = None
+    apply_rating_change(
+        instance.recipe_id,
+        old_rating=previous[1] if previous else None,
+        new_rating=instance.rating,
+    )
+    versions.bump_recipe(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Rating)
+def update_summary_on_delete(sender, instance, **kwargs):
+    apply_rating_change(instance.recipe_id, old_rating=instance.rating)
+    versions.bump_recipe(instance.recipe_id)
+
+
+@receiver(pre_delete, sender=SavedRecipe)
+def uncount_saved_ingredients(sender, instance, **kwargs):
+    """Unsaving takes the recipe's ingredients out of the aggregated set
+    (its ingredient rows go with it by the cascade)."""
+    shopping.forget_ingredients(instance)
+
+
+@receiver(post_save, sender=WeeklyMealPlan)
+@receiver(post_delete, sender=WeeklyMealPlan)
+@receiver(post_save, sender=SavedRecipe)
+@receiver(post_delete, sender=SavedRecipe)
+@receiver(post_save, sender=ShoppingItem)
+@receiver(post_delete, sender=ShoppingItem)
+def bump_user_version(sender, instance, **kwargs):
+    """Retire the owner's cached planner/shopping list fragments."""
+    versions.bump_user(instance.user_id)
@@ -0,0 +1,187 @@
+"""Local stand-in for the TheMealDB API.
+
+Serves the endpoints used by the recipes app from an in-memory list of
+meals (synthetic, or loaded from a JSON fixture), with optional artificial
+latency and injected failures, so views can be exercised and benchmarked
+without network access. Point MEALDB_BASE_URL at ``base_url``, or run the
+mealdb_standin command.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CATEGORIES = ['Beef', 'Chicken', 'Dessert', 'Lamb', 'Pasta', 'Seafood', 'Vegetarian']
+AREAS = ['American', 'British', 'French', 'Indian', 'Italian', 'Japanese', 'Mexican']
+INGREDIENTS = [
+    'Butter', 'Chicken', 'Eggs', 'Flour', 'Garlic', 'Lemon', 'Milk', 'Olive Oil',
+    'Onion', 'Pepper', 'Potatoes', 'Rice', 'Salt', 'Sugar', 'Tomatoes', 'Basil',
+]
+
+
+def synthetic_meals(count, seed=0):
+    """Return ``count`` deterministic lookup.php-shaped meal payloads."""
+    rng = random.Random(seed)
+    meals = []
+    for i in range(count):
+        meal_id = str(90000 + i)
+        meal = {
+            'idMeal': meal_id,
+            'strMeal': f'Stand-in Meal {i}',
+            'strCategory': CATEGORIES[i % len(CATEGORIES)],
+            'strArea': AREAS[(i // len(CATEGORIES)) % len(AREAS)],
+            'strInstructions': 'Mix everything and cook until done.',
+            'strMealThumb': f'https://www.themealdb.com/images/media/meals/standin{meal_id}.jpg',
+            'strTags': 'StandIn',
+        }
+        chosen = rng.sample(INGREDIENTS, rng.randint(3, 12))
+        for position in range(1, 21):
+            has_ingredient = position <= len(chosen)
+            meal[f'strIngredient{position}'] = chosen[position - 1] if has_ingredient else ''
+            meal[f'strMeasure{position}'] = '1 cup' if has_ingredient else ''
+        meals.append(meal)
+    return meals
+
+
+def load_fixture(path):
+    """Return the meals of a JSON fixture: either a list of lookup.php
+    payloads or a lookup.php-shaped ``{"meals": [...]}`` body."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    meals = data.get('meals') if isinstance(data, dict) else data
+    return [meal for meal in meals or [] if meal.get('idMeal')]
+
+
+def _summary(meal):
+    return {key: meal[key] for key in ('idMeal', 'strMeal', 'strMealThumb')}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rsplit('/', 1)[-1]
+        with server.lock:
+            server.calls[endpoint] += 1
+            delay = server.latency + (server.rng.uniform(0, server.jitter) if server.jitter else 0)
+            failed = server.error_rate and server.rng.random() < server.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self.send_json({'error': 'injected failure'}, status=server.error_status)
+            return
+
+        handler = getattr(self, 'get_' + endpoint.replace('.php', ''), None)
+        if handler is None:
+            self.send_json({'error': 'unknown endpoint'}, status=404)
+            return
+        meals = handler(params)
+        self.send_json({'meals': meals or None})
+
+    def send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (e.g. its deadline passed)
+
+    def get_random(self, params):
+        with self.server.lock:
+            return [self.server.rng.choice(self.server.meals)] if self.server.meals else []
+
+    def get_lookup(self, params):
+        meal = self.server.by_id.get(params.get('i', ''))
+        return [meal] if meal else []
+
+    def get_search(self, params):
+        term = params.get('s', '').lower()
+        return [meal for meal in self.server.meals if term in meal['strMeal'].lower()]
+
+    def get_filter(self, params):
+        for param, key in (('c', 'strCategory'), ('a', 'strArea')):
+            if param in params:
+                value = params[param].lower()
+                return [_summary(m) for m in self.server.meals if (m.get(key) or '').lower() == value]
+        if 'i' in params:
+            value = params['i'].lower()
+            return [
+                _summary(m) for m in self.server.meals
+                if any((m.get(f'strIngredient{n}') or '').lower() == value for n in range(1, 21))
+            ]
+        return []
+
+    def get_list(self, params):
+        key = 'strCategory' if 'c' in params else 'strArea'
+        names = sorted({m[key] for m in self.server.meals if m.get(key)})
+        return [{key: name} for name in names]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class MealDBStandIn:
+    """Runs a stand-in TheMealDB server in a background thread.
+
+    Usable as a context manager; ``base_url`` is available once started.
+    Each call waits ``latency`` seconds plus up to ``jitter`` more, and
+    fails with ``error_status`` at ``error_rate`` (0..1). ``calls`` counts
+    the calls per endpoint (e.g. 'lookup.php').
+    """
+
+    def __init__(self, meals, latency=0.0, host='127.0.0.1', port=0,
+                 jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.httpd = StandInServer((host, port), StandInHandler)
+        self.httpd.meals = list(meals)
+        self.httpd.by_id = {meal['idMeal']: meal for meal in self.httpd.meals}
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        self.httpd.error_rate = error_rate
+        self.httpd.error_status = error_status
+        self.httpd.rng = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.calls = Counter()
+        self._thread = None
+
+    @property
+    def calls(self):
+        return self.httpd.calls
+
+    def total_calls(self):
+        with self.httpd.lock:
+            return sum(self.httpd.calls.values())
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
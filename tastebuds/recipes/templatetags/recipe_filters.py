@@ -1,5 +1,7 @@
 from django import template
 
+from recipes import thumbnails
+
 register = template.Library()
 
 
@@ -9,3 +11,10 @@ def get_item(dictionary, key):
     if dictionary is None:
         return None
     return dictionary.get(key, [])
+
+
+@register.simple_tag
+def thumb_url(recipe_id, size, image=None):
+    """URL of a recipe's image at a THUMBNAIL_SIZES size, passing along its
+    upstream URL (strMealThumb) if known."""
+    return thumbnails.thumb_url(recipe_id, size, image)
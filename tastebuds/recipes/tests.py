@@ -1,3 +1,674 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection, transaction
+from django.db.models.signals import post_migrate
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from . import catalog, search, shopping, thumbnails, versions, views
+from .pantry import IngredientIndex
+from .cache import TieredCache, recipe_cache
+from .models import Meal, Rating, RatingSummary, SavedIngredientCount, SavedRecipe, WeeklyMealPlan
+from .planner import PlannerOperationError, apply_operations
+from .ratings import decode_cursor, reviews_page
+
+
+class RecipeCacheTests(SimpleTestCase):
+    """The in-process tier in front of the shared cache backend."""
+
+    def make_cache(self):
+        backend = LocMemCache('recipe-cache-tests', {})
+        return TieredCache('recipe', maxsize=10, ttl=60, stale_ttl=60, negative_ttl=5, backend=backend)
+
+    def test_get_many_reads_backend_once(self):
+        shared = self.make_cache()
+        shared.set('1', {'idMeal': '1'})
+        shared.set('2', None)
+        local = self.make_cache()
+        local.backend = shared.backend
+        local.set('3', {'idMeal': '3'})
+
+        with mock.patch.object(shared.backend, 'get_many', wraps=shared.backend.get_many) as get_many:
+            found = local.get_many(['1', '2', '3', '4'])
+        self.assertEqual(found, {'1': {'idMeal': '1'}, '2': None, '3': {'idMeal': '3'}})
+        get_many.assert_called_once_with(['recipe:1', 'recipe:2', 'recipe:4'])
+        self.assertEqual(local.stats()['misses'], 1)
+
+    async def test_async_methods_use_async_backend(self):
+        entry = ({'idMeal': '1'}, float('inf'), float('inf'))
+        backend = mock.Mock(aget=mock.AsyncMock(return_value=entry), aset=mock.AsyncMock(),
+                            aget_many=mock.AsyncMock(return_value={'recipe:1': entry}))
+        local = TieredCache('recipe', maxsize=10, ttl=60, stale_ttl=60, negative_ttl=5, backend=backend)
+
+        self.assertEqual(await local.aget_many(['1', '2']), {'1': {'idMeal': '1'}})
+        local.clear()
+        self.assertEqual(await local.aget('1'), {'idMeal': '1'})
+        await local.aset('2', None)
+        backend.aget_many.assert_awaited_once_with(['recipe:1', 'recipe:2'])
+        backend.aset.assert_awaited_once()
+        for method in (backend.get, backend.get_many, backend.set):
+            method.assert_not_called()
+
+
+class RatingSummaryTests(TestCase):
+    """Rating writes keep the recipe's summary row in step."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def assertSummary(self, recipe_id, count, total, stars):
+        summary = RatingSummary.objects.get(recipe_id=recipe_id)
+        self.assertEqual((summary.count, summary.total), (count, total))
+        self.assertEqual([getattr(summary, f'stars_{star}') for star in range(1, 6)], stars)
+
+    def test_create(self):
+        Rating.objects.create(user=self.alice, recipe_id=52772, rating=4)
+        Rating.objects.create(user=self.bob, recipe_id=52772, rating=2)
+        self.assertSummary(52772, 2, 6, [0, 1, 0, 1, 0])
+
+    def test_update(self):
+        rating = Rating.objects.create(user=self.alice, recipe_id=52772, rating=4)
+        rating.rating = 1
+        rating.save()
+        self.assertSummary(52772, 1, 1, [1, 0, 0, 0, 0])
+
+    def test_delete(self):
+        rating = Rating.objects.create(user=self.alice, recipe_id=52772, rating=4)
+        Rating.objects.create(user=self.bob, recipe_id=52772, rating=5)
+        rating.delete()
+        self.assertSummary(52772, 1, 5, [0, 0, 0, 0, 1])
+
+    def test_recipe_change(self):
+        rating = Rating.objects.create(user=self.alice, recipe_id=52772, rating=4)
+        rating.recipe_id = 52773
+        rating.rating = 3
+        rating.save()
+        self.assertSummary(52772, 0, 0, [0, 0, 0, 0, 0])
+        self.assertSummary(52773, 1, 3, [0, 0, 1, 0, 0])
+
+    def test_update_and_delete_without_summary(self):
+        # Ratings written before summaries were kept have no summary row
+        rating = Rating.objects.create(user=self.alice, recipe_id=52772, rating=4)
+        Rating.objects.create(user=self.bob, recipe_id=52772, rating=2)
+        RatingSummary.objects.all().delete()
+        rating.rating = 5
+        rating.save()
+        self.assertSummary(52772, 2, 7, [0, 1, 0, 0, 1])
+
+        RatingSummary.objects.all().delete()
+        rating.delete()
+        self.assertSummary(52772, 1, 2, [0, 1, 0, 0, 0])
+
+
+class ReviewsPageTests(TestCase):
+    """Keyset pages of a recipe's reviews, newest first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(5)])
+        for user in users:
+            Rating.objects.create(user=user, recipe_id=52772, rating=3)
+
+    def test_ties_on_created_at(self):
+        # Ratings written in the same instant are ordered by id
+        created_at = Rating.objects.first().created_at
+        Rating.objects.update(created_at=created_at)
+        expected = list(Rating.objects.order_by('-id').values_list('id', flat=True))
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = reviews_page(52772, cursor, limit=2)
+            seen.extend(rating.id for rating in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_malformed_cursor(self):
+        for cursor in ('not base64!', 'bm8gc2VwYXJhdG9y', 'eHx5'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+                response = self.client.get(reverse('recipes.reviews', args=[52772]), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class PlannerOperationsTests(TestCase):
+    """Batch planner operations are played in order and written at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret')
+        cls.other = User.objects.create_user('other')
+        cls.saved = SavedRecipe.objects.create(user=cls.user, recipe_id='52772', recipe_name='Teriyaki Chicken')
+        cls.plan = WeeklyMealPlan.objects.create(user=cls.user, saved_recipe=cls.saved,
+                                                 day='Monday', meal_slot='Lunch')
+        other_saved = SavedRecipe.objects.create(user=cls.other, recipe_id='52772', recipe_name='Teriyaki Chicken')
+        cls.other_plan = WeeklyMealPlan.objects.create(user=cls.other, saved_recipe=other_saved,
+                                                       day='Monday', meal_slot='Lunch')
+
+    def slots(self, user):
+        return sorted(WeeklyMealPlan.objects.filter(user=user).values_list('day', 'meal_slot'))
+
+    def test_move_then_clear(self):
+        created, moved, removed = apply_operations(self.user, [
+            {'op': 'move', 'meal_plan_id': self.plan.id, 'day': 'Tuesday', 'meal_slot': 'Dinner'},
+            {'op': 'clear_day', 'day': 'Tuesday'},
+        ])
+        self.assertEqual((created, moved, removed), ([], 0, 1))
+        self.assertEqual(self.slots(self.user), [])
+
+    def test_copy_day_includes_pending_adds(self):
+        created, moved, removed = apply_operations(self.user, [
+            {'op': 'add', 'saved_recipe_id': self.saved.id, 'day': 'Monday', 'meal_slot': 'Dinner'},
+            {'op': 'copy_day', 'from_day': 'Monday', 'to_day': 'Friday'},
+        ])
+        self.assertEqual((len(created), moved, removed), (3, 0, 0))
+        self.assertEqual(self.slots(self.user), [
+            ('Friday', 'Dinner'), ('Friday', 'Lunch'), ('Monday', 'Dinner'), ('Monday', 'Lunch'),
+        ])
+
+    def test_remove_twice(self):
+        with self.assertRaises(PlannerOperationError) as raised:
+            apply_operations(self.user, [
+                {'op': 'remove', 'meal_plan_id': self.plan.id},
+                {'op': 'remove', 'meal_plan_id': self.plan.id},
+            ])
+        self.assertEqual(raised.exception.index, 1)
+        self.assertEqual(self.slots(self.user), [('Monday', 'Lunch')])
+
+    def test_other_users_plan(self):
+        for operation in (
+            {'op': 'move', 'meal_plan_id': self.other_plan.id, 'day': 'Tuesday', 'meal_slot': 'Dinner'},
+            {'op': 'remove', 'meal_plan_id': self.other_plan.id},
+            {'op': 'add', 'saved_recipe_id': self.other_plan.saved_recipe_id, 'day': 'Monday', 'meal_slot': 'Dinner'},
+        ):
+            with self.subTest(op=operation['op']):
+                with self.assertRaises(PlannerOperationError):
+                    apply_operations(self.user, [operation])
+        self.assertEqual(self.slots(self.other), [('Monday', 'Lunch')])
+        self.assertEqual(self.slots(self.user), [('Monday', 'Lunch')])
+
+    def test_non_list_body(self):
+        self.client.login(username='planner', password='secret')
+        url = reverse('recipes.planner_batch')
+        for body in ('[]', '{"operations": {"op": "clear_week"}}', '{"operations": "clear_week"}', 'nope'):
+            with self.subTest(body=body):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.slots(self.user), [('Monday', 'Lunch')])
+
+    def test_unhashable_fields(self):
+        self.client.login(username='planner', password='secret')
+        url = reverse('recipes.planner_batch')
+        add = {'op': 'add', 'saved_recipe_id': self.saved.id, 'day': 'Monday', 'meal_slot': 'Dinner'}
+        for field, value in (('saved_recipe_id', [self.saved.id]), ('saved_recipe_id', '²'),
+                             ('day', ['Monday']), ('meal_slot', {})):
+            with self.subTest(field=field, value=value):
+                body = json.dumps({'operations': [{**add, field: value}]})
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['operation'], 0)
+        body = json.dumps({'operations': [{'op': 'copy_day', 'from_day': ['Monday'], 'to_day': 'Friday'}]})
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.slots(self.user), [('Monday', 'Lunch')])
+
+
+class FacetTests(TestCase):
+    """Combined category and area filters from the facet table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for meal_id, name, category, area in (
+            ('1', 'Zucchini Bake', 'Vegetarian', 'British'),
+            ('3', 'Apple Pie', 'Dessert', 'British'),
+            ('2', 'Apple Pie', 'Dessert', 'British'),
+            ('4', 'Bread Pudding', 'Dessert', 'British'),
+            ('5', 'Beignets', 'Dessert', 'American'),
+        ):
+            catalog.store_meal({'idMeal': meal_id, 'strMeal': name, 'strCategory': category,
+                                'strArea': area, 'strMealThumb': ''})
+        catalog.mark_category_synced('Dessert')
+        catalog.mark_category_synced('Vegetarian')
+        catalog.refresh_facets()
+
+    def setUp(self):
+        # refresh_facets drops the cached counts on commit, which TestCase never reaches
+        cache.delete(catalog.FACET_COUNTS_KEY)
+
+    def test_meals_ordered_by_name_then_id(self):
+        meals = catalog.meals_by_facet('dessert', 'BRITISH')
+        self.assertEqual([meal['idMeal'] for meal in meals], ['2', '3', '4'])
+
+    def test_counts_ordered_by_name(self):
+        counts = catalog.facet_counts()
+        self.assertEqual(counts['categories'], [('Dessert', 4), ('Vegetarian', 1)])
+        self.assertEqual(counts['areas'], [])  # no area is fully mirrored
+
+    def test_unmirrored_pair(self):
+        self.assertEqual(catalog.meals_by_facet('Vegetarian', 'American'), [])
+        self.assertIsNone(catalog.meals_by_facet('Beef', 'American'))
+
+
+class CategoryListTests(TestCase):
+    """Category lists are answered locally only when that is complete."""
+
+    def test_unknown_category_once_listed(self):
+        self.assertIsNone(catalog.meals_by_category('pizza'))
+        catalog.store_categories(['Beef', 'Dessert'])
+        self.assertEqual(catalog.meals_by_category('pizza'), [])
+        self.assertIsNone(catalog.meals_by_category('beef'))
+
+    def test_synced_category(self):
+        catalog.store_meal({'idMeal': '1', 'strMeal': 'Beef Wellington', 'strCategory': 'Beef',
+                            'strArea': 'British', 'strMealThumb': ''})
+        self.assertIsNone(catalog.meals_by_category('Beef'))
+        catalog.mark_category_synced('Beef')
+        self.assertEqual([meal['idMeal'] for meal in catalog.meals_by_category('BEEF')], ['1'])
+
+
+class NameSearchTests(TestCase):
+    """Free text search goes upstream until the catalog is mirrored in full."""
+
+    def setUp(self):
+        catalog.store_meal({'idMeal': '1', 'strMeal': 'Chicken Curry', 'strCategory': 'Chicken',
+                            'strArea': 'Indian', 'strMealThumb': ''})
+        catalog.store_categories(['Chicken'])
+
+    def test_partial_mirror(self):
+        found = [{'idMeal': '2', 'strMeal': 'Chicken Pie', 'strCategory': 'Chicken',
+                  'strArea': 'British', 'strMealThumb': ''}]
+        with mock.patch('recipes.views.client.meals', return_value=found) as meals:
+            results = views.search_by_name('chicken')
+        meals.assert_called_once_with('search.php', s='chicken')
+        self.assertEqual([meal['idMeal'] for meal in results], ['2', '1'])
+        self.assertIsNotNone(catalog.local_meal('2'))
+
+    def test_full_mirror(self):
+        catalog.mark_category_synced('Chicken')
+        with mock.patch('recipes.views.client.meals') as meals:
+            results = views.search_by_name('chicken')
+        meals.assert_not_called()
+        self.assertEqual([meal['idMeal'] for meal in results], ['1'])
+
+    def test_index_checked_again_after_migrate(self):
+        # A database recreated under the same name has lost the FTS table
+        self.assertTrue(search.ensure_index())
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {search.FTS_TABLE}')
+        search.create_index(signal=post_migrate)
+        self.assertIn(search.FTS_TABLE, connection.introspection.table_names())
+
+
+class IngredientIndexTests(TestCase):
+    """Single-recipe updates leave the index as a rebuild would."""
+
+    meals = [(1, 'Omelette', ''), (2, 'Pancakes', '')]
+    ingredients = [(1, 'Eggs'), (1, 'Butter'), (2, 'Flour'), (2, 'Eggs'), (2, 'Milk')]
+
+    def assertSameMatches(self, index, rebuilt):
+        for pantry in (['eggs'], ['flour', 'milk'], ['egg', 'butter'], ['sugar', 'milk']):
+            with self.subTest(pantry=pantry):
+                self.assertEqual(index.match(pantry), rebuilt.match(pantry))
+
+    def test_add_meal(self):
+        index = IngredientIndex(self.meals, self.ingredients)
+        index.update_meal(3, 'Custard', '', ['Milk', 'Eggs', 'Sugar'])
+        rebuilt = IngredientIndex(self.meals + [(3, 'Custard', '')],
+                                  self.ingredients + [(3, 'Milk'), (3, 'Eggs'), (3, 'Sugar')])
+        self.assertEqual(len(index), 3)
+        self.assertSameMatches(index, rebuilt)
+
+    def test_replace_meal(self):
+        index = IngredientIndex(self.meals, self.ingredients)
+        index.update_meal(1, 'Sweet Omelette', '', ['Eggs', 'Sugar', ' '])
+        rebuilt = IngredientIndex([(1, 'Sweet Omelette', ''), (2, 'Pancakes', '')],
+                                  [(1, 'Eggs'), (1, 'Sugar')] + self.ingredients[2:])
+        self.assertEqual(len(index), 2)
+        self.assertSameMatches(index, rebuilt)
+        self.assertEqual(list(index.postings[index.term_id('butter')]), [])
+
+    def test_refresh_from_catalog(self):
+        # Recipes stored by another process (store_meal's on_commit update
+        # never runs inside a TestCase)
+        catalog.store_meal({'idMeal': '1', 'strMeal': 'Omelette', 'strIngredient1': 'Eggs'})
+        index = IngredientIndex.build()
+        catalog.store_meal({'idMeal': '2', 'strMeal': 'Pancakes', 'strIngredient1': 'Flour',
+                            'strIngredient2': 'Eggs'})
+        self.assertEqual(index.match(['flour'])[0], [])
+        self.assertTrue(index.refresh())
+        self.assertEqual([meal['idMeal'] for meal in index.match(['flour'])[0]], ['2'])
+
+        Meal.objects.filter(id=1).delete()
+        self.assertFalse(index.refresh())
+
+
+class FragmentCacheTests(TestCase):
+    """Cached page fragments are only written from loaded data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', password='secret')
+        SavedRecipe.objects.create(user=cls.user, recipe_id='52772', recipe_name='Teriyaki Chicken')
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='cook', password='secret')
+
+    def board_key(self):
+        return make_template_fragment_key('planner', [self.user.id, versions.user_version(self.user.id)])
+
+    @override_settings(VERSIONED_CACHING=True)
+    def test_fragment_read_once(self):
+        response = self.client.get(reverse('recipes.planner'))
+        self.assertContains(response, 'Teriyaki Chicken')
+        self.assertIsNotNone(cache.get(self.board_key()))
+
+        # The view got the fragment, which then expired before the render:
+        # the page still shows it and nothing unloaded is cached
+        with mock.patch('recipes.versions.cached_fragment', return_value=mark_safe('<p>Board</p>')):
+            cache.delete(self.board_key())
+            response = self.client.get(reverse('recipes.planner'))
+        self.assertContains(response, '<p>Board</p>')
+        self.assertIsNone(cache.get(self.board_key()))
+
+    @override_settings(VERSIONED_CACHING=False)
+    def test_off_with_per_process_cache(self):
+        response = self.client.get(reverse('recipes.planner'))
+        self.assertContains(response, 'Teriyaki Chicken')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(cache.get(self.board_key()))
+
+class IngredientCountTests(TestCase):
+    """The aggregated ingredient set follows saves and unsaves."""
+
+    recipes = {
+        '1': {'idMeal': '1', 'strIngredient1': 'Eggs', 'strIngredient2': 'Butter', 'strIngredient3': 'Eggs'},
+        '2': {'idMeal': '2', 'strIngredient1': 'Eggs', 'strIngredient2': 'Flour'},
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper')
+
+    def counts(self):
+        return dict(SavedIngredientCount.objects.filter(user=self.user).values_list('name', 'recipes'))
+
+    def save(self, recipe_id):
+        saved_recipe = SavedRecipe.objects.create(user=self.user, recipe_id=recipe_id, recipe_name=recipe_id)
+        shopping.store_resolved([saved_recipe], self.recipes)
+        return saved_recipe
+
+    def test_save_and_unsave(self):
+        first = self.save('1')
+        self.save('2')
+        self.assertEqual(self.counts(), {'Butter': 1, 'Eggs': 2, 'Flour': 1})
+        self.assertEqual(shopping.ingredient_names(self.user), {'Butter', 'Eggs', 'Flour'})
+
+        first.delete()
+        self.assertEqual(self.counts(), {'Eggs': 1, 'Flour': 1})
+
+    def test_restore_and_recompute(self):
+        saved_recipe = self.save('1')
+        shopping.store_resolved([saved_recipe], {'1': self.recipes['2']})
+        incremental = self.counts()
+        self.assertEqual(incremental, {'Eggs': 1, 'Flour': 1})
+        shopping.recompute_counts()
+        self.assertEqual(self.counts(), incremental)
+
+
+class ThumbnailTests(TestCase):
+    """Recipe images come from the URL the page already had."""
+
+    image = 'https://www.themealdb.com/images/media/meals/teriyaki.jpg'
+
+    def setUp(self):
+        cache.clear()  # failed fetches are remembered
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(THUMBNAIL_ROOT=root.name))
+        self.get_meal = self.enterContext(mock.patch('recipes.catalog.get_meal'))
+
+    def test_signed_source(self):
+        url = thumbnails.thumb_url(52772, 'small', self.image)
+        with mock.patch('recipes.thumbnails.client.fetch', return_value=b'\xff\xd8\xff not really') as fetch:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        fetch.assert_called_once_with(self.image, max_bytes=mock.ANY)
+        self.get_meal.assert_not_called()
+
+    def test_redirect_on_failure(self):
+        url = thumbnails.thumb_url(52772, 'small', self.image)
+        with mock.patch('recipes.thumbnails.client.fetch', side_effect=OSError):
+            response = self.client.get(url)
+        self.assertRedirects(response, self.image, fetch_redirect_response=False)
+        self.get_meal.assert_not_called()
+
+    def test_unsigned_source(self):
+        self.get_meal.return_value = None
+        url = reverse('recipes.thumb', args=[52772, 'small']) + '?src=https://example.com/x.jpg'
+        with mock.patch('recipes.thumbnails.client.fetch') as fetch:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        fetch.assert_not_called()
+
+
+@override_settings(VERSIONED_CACHING=True)
+class ConditionalGetTests(TestCase):
+    """Unchanged pages are answered with 304 until a write changes them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', password='secret')
+        catalog.store_meal({'idMeal': '52772', 'strMeal': 'Teriyaki Chicken', 'strCategory': 'Chicken',
+                            'strArea': 'Japanese', 'strMealThumb': '', 'strIngredient1': 'Soy Sauce'})
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='cook', password='secret')
+
+    def etag(self, url):
+        self.client.get(url)  # sets the CSRF cookie, which the page's ETag includes
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag, not_modified=True):
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304 if not_modified else 200)
+
+    def test_show(self):
+        url = reverse('recipes.show', args=[52772])
+        etag = self.etag(url)
+        self.assertNotModified(url, etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=self.user, recipe_id=52772, rating=5)
+        self.assertNotModified(url, etag, False)
+
+    def test_planner(self):
+        url = reverse('recipes.planner')
+        etag = self.etag(url)
+        self.assertNotModified(url, etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            SavedRecipe.objects.create(user=self.user, recipe_id='52772', recipe_name='Teriyaki Chicken')
+        self.assertNotModified(url, etag, False)
+
+    def test_shopping_list(self):
+        url = reverse('recipes.shopping_list')
+        etag = self.etag(url)
+        self.assertNotModified(url, etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('recipes.add_shopping_item'), {'name': 'Rice'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(url, etag, False)
+
+
+class APITests(TestCase):
+    """Field selection, paging and validation of the JSON API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', password='secret')
+        catalog.store_meal({'idMeal': '52772', 'strMeal': 'Teriyaki Chicken', 'strCategory': 'Chicken',
+                            'strArea': 'Japanese', 'strMealThumb': '', 'strIngredient1': 'Soy Sauce'})
+        SavedRecipe.objects.bulk_create([
+            SavedRecipe(user=cls.user, recipe_id=str(i), recipe_name=f'Recipe {i}') for i in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='cook', password='secret')
+
+    def test_recipe_fields(self):
+        url = reverse('recipes.api.recipe', args=[52772])
+        response = self.client.get(url, {'fields': 'idMeal,strMeal'})
+        self.assertEqual(response.json(), {'idMeal': '52772', 'strMeal': 'Teriyaki Chicken'})
+        response = self.client.get(url, {'fields': 'idMeal,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Unknown fields: password'})
+
+    def test_unknown_recipe(self):
+        with mock.patch('recipes.catalog.fetch_meal', return_value=None):
+            response = self.client.get(reverse('recipes.api.recipe', args=[1]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(API_MAX_PAGE_SIZE=2)
+    def test_paging(self):
+        url = reverse('recipes.api.saved')
+        for params, ids, next_offset in (
+            ({'limit': 2}, ['2', '1'], 2),
+            ({'offset': 2, 'limit': 2}, ['0'], None),
+            ({'offset': -5, 'limit': 0}, ['2'], 1),  # clamped to offset 0, limit 1
+            ({'limit': 1000}, ['2', '1'], 2),  # clamped to API_MAX_PAGE_SIZE
+            ({'offset': 10}, [], None),
+        ):
+            with self.subTest(params=params):
+                data = self.client.get(url, {**params, 'fields': 'recipe_id'}).json()
+                self.assertEqual(data['count'], 3)
+                self.assertEqual([item['recipe_id'] for item in data['results']], ids)
+                self.assertEqual(data['next_offset'], next_offset)
+        for params in ({'limit': 'ten'}, {'offset': '1.5'}, {'fields': 'recipe_id,user'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    @override_settings(VERSIONED_CACHING=True)
+    def test_etag_varies_on_query(self):
+        for url in (reverse('recipes.api.recipe', args=[52772]), reverse('recipes.api.saved')):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(url, {'fields': 'recipe_id' if 'saved' in url else 'idMeal'},
+                                           headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 200)
+        saved_etag = self.client.get(reverse('recipes.api.saved'))['ETag']
+        self.assertNotEqual(self.client.get(reverse('recipes.api.planner'))['ETag'], saved_etag)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('recipes.api.saved')).status_code, 302)
+
+
+class SaveRecipeTests(TestCase):
+
+    def test_known_missing_recipe(self):
+        User.objects.create_user('saver', password='secret')
+        self.client.login(username='saver', password='secret')
+        recipe_cache.set('123', None)  # lookup.php had no such meal
+        try:
+            response = self.client.post(reverse('recipes.save', args=[123]))
+        finally:
+            recipe_cache.delete('123')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(SavedRecipe.objects.exists())
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_ALLOWED_IPS=[])
+class MetricsAccessTests(TestCase):
+    """/metrics and the Server-Timing header are for staff and allowed IPs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        User.objects.create_user('cook', password='secret')
+
+    def assertAccess(self, client, allowed):
+        response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200 if allowed else 403)
+        response = client.get(reverse('home.index'))
+        self.assertEqual(response.has_header('Server-Timing'), allowed)
+
+    async def aassertAccess(self, client, allowed):
+        response = await client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200 if allowed else 403)
+        response = await client.get(reverse('home.index'))
+        self.assertEqual(response.has_header('Server-Timing'), allowed)
+
+    def test_sync(self):
+        self.assertAccess(self.client, False)
+        self.client.login(username='cook', password='secret')
+        self.assertAccess(self.client, False)
+        self.client.login(username='staff', password='secret')
+        self.assertAccess(self.client, True)
+
+    def test_allowed_ip(self):
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertAccess(self.client, True)
+
+    async def test_async(self):
+        await self.aassertAccess(self.async_client, False)
+        await self.async_client.alogin(username='cook', password='secret')
+        await self.aassertAccess(self.async_client, False)
+        await self.async_client.alogin(username='staff', password='secret')
+        await self.aassertAccess(self.async_client, True)
+        self.assertIn(b'tastebuds_request_duration_seconds_count', (await self.async_client.get(reverse('metrics'))).content)
+
+
+class ConcurrentRatingWritesTests(TransactionTestCase):
+    """Parallel rating writes must queue on the database lock, not fail
+    with "database is locked"."""
+
+    writers = 16
+
+    def test_parallel_ratings_of_one_recipe(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-based test database')
+        users = User.objects.bulk_create([User(username=f'rater{i}') for i in range(self.writers)])
+        barrier = threading.Barrier(self.writers)
+        errors = []
+
+        def rate(user, stars):
+            try:
+                barrier.wait()
+                # Reads then writes in one transaction, like a rating POST
+                with transaction.atomic():
+                    Rating.objects.filter(user=user, recipe_id='52772').exists()
+                    Rating.objects.create(user=user, recipe_id='52772', rating=stars)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=rate, args=(user, i % 5 + 1))
+            for i, user in enumerate(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Rating.objects.filter(recipe_id='52772').count(), self.writers)
+        summary = RatingSummary.objects.get(recipe_id=52772)
+        self.assertEqual(summary.count, self.writers)
+        self.assertEqual(summary.total, sum(i % 5 + 1 for i in range(self.writers)))
@@ -0,0 +1,186 @@
+"""Resized recipe images served from local disk.
+
+``/recipes/thumb/<idMeal>/<size>/`` fetches a recipe's image from
+TheMealDB once and stores it under THUMBNAIL_ROOT, keyed by the SHA-256 of
+its content; each size in THUMBNAIL_SIZES is written next to it the first
+time it is asked for. An image is never fetched or resized twice, so the
+responses can be cached by browsers and proxies for good.
+
+Pages build the URLs with ``thumb_url``, which passes the image URL they
+already have (``strMealThumb``) signed in ``src``, so the endpoint doesn't
+have to look the recipe up. Without ``src`` it asks ``catalog.get_meal``.
+
+Resizing needs Pillow; without it (or for an image Pillow can't read) the
+original is served, and only cached for THUMBNAIL_ORIGINAL_MAX_AGE so the
+resized image replaces it once Pillow is installed.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+
+from . import catalog
+from .mealdb import client
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # serve the originals unresized
+
+# Leading bytes -> file extension of the image formats TheMealDB serves
+_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF8', '.gif'),
+)
+
+# Striped locks so concurrent first requests for one recipe fetch it once
+_locks = [threading.Lock() for _ in range(64)]
+
+_signer = signing.Signer(salt='recipes.thumbnails')
+
+
+def _root():
+    return Path(settings.THUMBNAIL_ROOT)
+
+
+def _failed_key(meal_id):
+    return f'recipes:thumb:failed:{meal_id}'
+
+
+def _extension(data):
+    for signature, extension in _SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def _write(path, data):
+    """Write a file atomically, so readers never see a partial image."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _resize(data, width):
+    with Image.open(BytesIO(data)) as image:
+        image.thumbnail((width, width), Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        out = BytesIO()
+        image.save(out, 'JPEG', quality=settings.THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def thumb_url(meal_id, size, image=None):
+    """URL of a recipe's image at ``size``; ``image`` is its upstream URL
+    (``strMealThumb``) if known."""
+    url = reverse('recipes.thumb', kwargs={'id': meal_id, 'size': size})
+    if image:
+        url += '?' + urlencode({'src': _signer.sign(image)})
+    return url
+
+
+def source(signed):
+    """The upstream image URL of a ``src`` parameter, or None if it is
+    missing or was not signed here."""
+    try:
+        return _signer.unsign(signed) if signed else None
+    except signing.BadSignature:
+        return None
+
+
+def upstream_url(meal_id, src=None):
+    """The upstream image URL to send the browser to when the image can't
+    be served, from ``src`` or the locally known recipe; None if unknown."""
+    if src:
+        return src
+    meal = catalog.local_meal(meal_id)
+    return (meal and meal.get('strMealThumb')) or None
+
+
+def _fetch_original(meal_id, url):
+    """Download the recipe's image and store it; return its file name
+    (``<sha256><ext>``), or None if the recipe has no usable image."""
+    if not url:
+        meal = catalog.get_meal(meal_id)
+        url = meal and meal.get('strMealThumb')
+    if not url:
+        return None
+    data = client.fetch(url, max_bytes=settings.THUMBNAIL_MAX_BYTES)
+    extension = _extension(data)
+    if extension is None:
+        return None
+    name = hashlib.sha256(data).hexdigest() + extension
+    path = _root() / 'originals' / name[:2] / name
+    if not path.exists():
+        _write(path, data)
+    _write(_root() / 'ids' / str(meal_id), name.encode())
+    return name
+
+
+def _original(meal_id, url):
+    """Return the file name of the recipe's stored image, fetching it (from
+    ``url`` if given) on first use; None if it is unavailable. Failed
+    fetches are not retried for RECIPE_CACHE_NEGATIVE_TTL seconds."""
+    id_file = _root() / 'ids' / str(meal_id)
+    try:
+        return id_file.read_text()
+    except FileNotFoundError:
+        pass
+    if cache.get(_failed_key(meal_id)):
+        return None
+
+    with _locks[meal_id % len(_locks)]:
+        try:
+            return id_file.read_text()
+        except FileNotFoundError:
+            pass
+        try:
+            name = _fetch_original(meal_id, url)
+        except Exception:
+            name = None
+        if name is None:
+            cache.set(_failed_key(meal_id), True, settings.RECIPE_CACHE_NEGATIVE_TTL)
+        return name
+
+
+def get_thumbnail(meal_id, size, url=None):
+    """Return ``(path, digest, resized)`` of a recipe's image at ``size`` (a
+    key of THUMBNAIL_SIZES), or None if the image is unavailable. ``url`` is
+    the upstream image, if known. ``resized`` is False when the original is
+    served instead."""
+    meal_id = int(meal_id)
+    name = _original(meal_id, url)
+    if name is None:
+        return None
+    digest = name.split('.', 1)[0]
+    original = _root() / 'originals' / name[:2] / name
+    if Image is None:
+        return original, digest, False
+
+    path = _root() / size / name[:2] / f'{digest}.jpg'
+    if not path.exists():
+        try:
+            _write(path, _resize(original.read_bytes(), settings.THUMBNAIL_SIZES[size]))
+        except FileNotFoundError:
+            return None  # THUMBNAIL_ROOT was cleared under us
+        except Exception:
+            return original, digest, False  # not an image Pillow can read
+    return path, f'{digest}-{size}', True
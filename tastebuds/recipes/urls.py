@@ -1,14 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+# Under ASGI the browsing views can run as coroutines (see async_views.py)
+if settings.RECIPES_ASYNC_VIEWS:
+    from . import async_views as browsing_views
+else:
+    browsing_views = views
 urlpatterns = [
-    path('', views.index, name='recipes.index'),
-    path('<int:id>/', views.show, name='recipes.show'),
+    path('', browsing_views.index, name='recipes.index'),
+    path('<int:id>/', browsing_views.show, name='recipes.show'),
     path('<int:id>/save/', views.save_recipe, name='recipes.save'),
+    path('<int:id>/reviews/', views.reviews, name='recipes.reviews'),
     path('planner/', views.planner, name='recipes.planner'),
     path('planner/add/', views.add_to_planner, name='recipes.add_to_planner'),
     path('planner/remove/<int:meal_plan_id>/', views.remove_from_planner, name='recipes.remove_from_planner'),
-    path('shopping-list/', views.shopping_list, name='recipes.shopping_list'),
+    path('planner/batch/', views.planner_batch, name='recipes.planner_batch'),
+    path('shopping-list/', browsing_views.shopping_list, name='recipes.shopping_list'),
     path('shopping-list/add/', views.add_shopping_item, name='recipes.add_shopping_item'),
     path('shopping-list/remove/<int:item_id>/', views.remove_shopping_item, name='recipes.remove_shopping_item'),
+    path('thumb/<int:id>/<str:size>/', views.thumbnail, name='recipes.thumb'),
+    path('cook-with/', views.cook_with, name='recipes.cook_with'),
+    path('api/recipes/<int:id>/', api.recipe_detail, name='recipes.api.recipe'),
+    path('api/saved/', api.saved_recipes, name='recipes.api.saved'),
+    path('api/planner/', api.planner, name='recipes.api.planner'),
+    path('api/shopping-list/', api.shopping_list, name='recipes.api.shopping_list'),
     path('map/', views.map_view, name='recipes.map'),
+    path('cache-stats/', views.cache_stats, name='recipes.cache_stats'),
 ]
\ No newline at end of file
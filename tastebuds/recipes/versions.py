@@ -0,0 +1,83 @@
+"""Data version counters for fragment caching.
+
+Each user has a version that changes whenever one of their planner,
+saved-recipe or shopping rows is written, and each recipe has one that
+changes whenever it is rated. Template fragments are cached under the
+version they were rendered from, so a write makes the old fragments
+unreachable instead of having to find and delete them.
+
+A version is the time of the last change (a float timestamp), so it also
+serves as a Last-Modified date. Versions live in the default cache, which
+must be shared (Redis, Memcached, ...) when several processes serve
+requests; with a per-process cache ``enabled`` is False (see
+VERSIONED_CACHING) and nothing is cached or validated by version.
+
+A view reads its fragment with ``cached_fragment`` and only queries the
+data for it when that returned None; the template then outputs the markup
+it was given instead of going back to the cache, which may have dropped the
+fragment in the meantime.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.utils.safestring import mark_safe
+
+
+def enabled():
+    """Whether caching and validation by data version are on."""
+    return settings.VERSIONED_CACHING
+
+
+def fragment_ttl():
+    """Timeout for ``{% cache %}``; 0 stores nothing while versions are off."""
+    return settings.FRAGMENT_CACHE_TTL if enabled() else 0
+
+
+def _key(kind, object_id):
+    return f'recipes:version:{kind}:{object_id}'
+
+
+def _get(kind, object_id):
+    key = _key(kind, object_id)
+    version = cache.get(key)
+    if version is None:
+        # Unknown or evicted: start a new version, which also retires any
+        # fragment cached under the forgotten one
+        cache.add(key, time.time(), timeout=settings.FRAGMENT_CACHE_TTL)
+        version = cache.get(key, time.time())
+    return version
+
+
+def _bump(kind, object_id):
+    """Move to a new version once the current transaction commits, so no
+    reader can cache pre-commit data under the new version."""
+    key = _key(kind, object_id)
+    transaction.on_commit(lambda: cache.set(key, time.time(), timeout=settings.FRAGMENT_CACHE_TTL))
+
+
+def user_version(user_id):
+    return _get('user', user_id)
+
+
+def recipe_version(recipe_id):
+    return _get('recipe', int(recipe_id))
+
+
+def bump_user(user_id):
+    _bump('user', user_id)
+
+
+def bump_recipe(recipe_id):
+    _bump('recipe', int(recipe_id))
+
+
+def cached_fragment(fragment_name, *vary_on):
+    """The markup of the ``{% cache %}`` fragment for these arguments, or
+    None if it is not cached and the view must load its data."""
+    if not enabled():
+        return None
+    markup = cache.get(make_template_fragment_key(fragment_name, vary_on))
+    return None if markup is None else mark_safe(markup)
@@ -1,60 +1,90 @@
-import requests
+import json
+import time
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.core.exceptions import PermissionDenied
 from django.views.decorators.http import require_POST
+from django.db import transaction
 from django.conf import settings
-from .models import Rating, SavedRecipe, WeeklyMealPlan, ShoppingItem
+from .models import Rating, RatingSummary, SavedRecipe, WeeklyMealPlan, ShoppingItem
 from .forms import RatingForm
-
-
-def fetch_random_recipes(n=8):
-    url = 'https://www.themealdb.com/api/json/v1/1/random.php'
-    recipes = []
-    for _ in range(n):
-        try:
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            meal = data.get('meals', [None])[0]
-            if meal:
-                recipes.append(meal)
-        except Exception:
-            continue
-    return recipes
+from . import catalog, pantry, shopping, thumbnails, versions
+from .cache import recipe_cache
+from .conditional import (conditional, planner_etag, planner_last_modified, reviews_etag,
+                          reviews_last_modified, shopping_list_etag, shopping_list_last_modified,
+                          show_etag)
+from .random_pool import random_pool
+from .mealdb import client, fan_out
+from .planner import PlannerOperationError, apply_operations
+from .ratings import reviews_page
+
+
+def fetch_random_recipes(n=8, timeout=None):
+    """Fetch n distinct random meals concurrently within one overall deadline."""
+    if timeout is None:
+        timeout = settings.MEALDB_RANDOM_DEADLINE
+    deadline = time.monotonic() + timeout
+
+    # random.php can hand back the same meal twice, so ask again for the
+    # shortfall while there is time left
+    recipes = {}
+    for _ in range(3):
+        missing = n - len(recipes)
+        if missing <= 0 or time.monotonic() >= deadline:
+            break
+        results, _ = fan_out(lambda _: client.meals('random.php'), range(missing), deadline)
+        for meals in results.values():
+            for meal in meals[:1]:
+                recipes.setdefault(meal['idMeal'], meal)
+
+    # Top up from the local catalog if upstream was too slow
+    if len(recipes) < n:
+        for meal in catalog.random_meals(n - len(recipes), exclude=recipes.keys()):
+            recipes.setdefault(meal['idMeal'], meal)
+
+    return list(recipes.values())[:n]
 
 
 def fetch_by_category(category):
-    """Fetch meals filtered by category from TheMealDB."""
-    url = f'https://www.themealdb.com/api/json/v1/1/filter.php?c={category}'
+    """Fetch meals filtered by category, local catalog first."""
+    meals = catalog.meals_by_category(category)
+    if meals is not None:
+        return meals
+
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get('meals') or []
+        return client.meals('filter.php', c=category)
     except Exception:
         return []
 
 
 def search_by_name(term):
-    """Search meals by name (allows more specific lookups like 'pizza')."""
-    url = f'https://www.themealdb.com/api/json/v1/1/search.php?s={term}'
+    """Search meals by name, ingredient, tag, etc. (allows more specific
+    lookups like 'pizza'): the local search index, merged with search.php
+    until the whole catalog is mirrored."""
+    meals = catalog.search_meals(term)
+    if catalog.fully_mirrored():
+        return meals
+
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get('meals') or []
+        found = client.meals('search.php', s=term)
     except Exception:
-        return []
+        return meals
+
+    # search.php returns full recipes, so keep them for next time
+    return catalog.merge_search(meals, found)
 
 
 def fetch_by_region(region):
-    """Fetch meals filtered by area/region from TheMealDB."""
-    url = f'https://www.themealdb.com/api/json/v1/1/filter.php?a={region}'
+    """Fetch meals filtered by area/region, local catalog first."""
+    meals = catalog.meals_by_area(region)
+    if meals is not None:
+        return meals
+
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get('meals') or []
+        return client.meals('filter.php', a=region)
     except Exception:
         return []
 
@@ -64,103 +94,124 @@ def index(request):
     category = request.GET.get('category', '').strip()
     region = request.GET.get('region', '').strip()
 
-    template_data = {
-        'title': 'Recipes',
-    }
-
-    # Initialize form fields so only the one typed into keeps its value
-    template_data['category_term'] = ''
-    template_data['region_term'] = ''
-
     if category or region:
         # Require registered user for searching
         if not request.user.is_authenticated:
             # redirect to login page
             return redirect(reverse('accounts.login'))
 
-        # If both provided, fetch both lists and intersect by idMeal
-        if category and region:
-            cat_results = fetch_by_category(category)
-            reg_results = fetch_by_region(region)
+        # Both given: one lookup in the facet table, else intersect the lists
+        combined_results = catalog.meals_by_facet(category, region) if category and region else None
+
+        # First try category filter (broad categories like 'Dessert'), and
+        # fall back to a text search (for specific items like 'pizza')
+        cat_results = fetch_by_category(category) if category and combined_results is None else []
+        template_data = index_search_data(
+            category, region,
+            cat_results=cat_results,
+            reg_results=fetch_by_region(region) if region and combined_results is None else [],
+            name_results=search_by_name(category) if category and not region and not cat_results else [],
+            combined_results=combined_results,
+        )
+    else:
+        # No search => show random picks from the pre-warmed pool, going
+        # upstream only until the pool has enough recipes
+        recipes = random_pool.sample(8)
+        if len(recipes) < 8:
+            recipes = fetch_random_recipes(8)
+        template_data = index_random_data(recipes)
+    template_data['facets'] = catalog.facet_counts()
 
-            # Build maps by idMeal for fast lookup
-            cat_map = {m.get('idMeal'): m for m in (cat_results or [])}
-            reg_map = {m.get('idMeal'): m for m in (reg_results or [])}
+    return render(request, 'recipes/index.html', {'template_data': template_data})
 
-            # Intersection of ids
-            intersect_ids = set(cat_map.keys()) & set(reg_map.keys())
-            results = [cat_map[i] for i in intersect_ids]
 
-            template_data['search_type'] = 'Category & Region'
-            template_data['search_term'] = f"{category} / {region}"
-            template_data['category_term'] = category
-            template_data['region_term'] = region
-        else:
-            # Prefer category if provided, otherwise region
-            if category:
-                # First try category filter (broad categories like 'Dessert')
-                cat_results = fetch_by_category(category)
-                # Also attempt name search (for specific items like 'pizza')
-                name_results = search_by_name(category)
-
-                # Prefer category results if they exist; otherwise fall back to name search
-                if cat_results:
-                    results = cat_results
-                    template_data['search_type'] = 'Category'
-                    template_data['search_term'] = category
-                else:
-                    results = name_results
-                    template_data['search_type'] = 'Name Search'
-                    template_data['search_term'] = category
+def index_random_data(recipes):
+    """Template data for the landing page's random picks."""
+    return {
+        'title': 'Recipes',
+        'category_term': '',
+        'region_term': '',
+        'recipes': recipes,
+    }
 
-                # Preserve both form fields appropriately
-                template_data['category_term'] = category
-                template_data['region_term'] = ''
-            else:
-                results = fetch_by_region(region)
-                template_data['search_type'] = 'Region'
-                template_data['search_term'] = region
-                template_data['region_term'] = region
-                template_data['category_term'] = ''
-
-        template_data['search_results'] = results
-        template_data['recipes'] = []
+
+def index_search_data(category, region, cat_results, reg_results, name_results, combined_results=None):
+    """Template data for a search, given the upstream results it needs."""
+    template_data = {
+        'title': 'Recipes',
+    }
+
+    # Initialize form fields so only the one typed into keeps its value
+    template_data['category_term'] = ''
+    template_data['region_term'] = ''
+
+    # If both provided, intersect both lists by idMeal
+    if category and region:
+        if combined_results is not None:
+            results = combined_results
+        else:
+            # Intersection of ids, keeping the category list's order
+            reg_ids = {m.get('idMeal') for m in (reg_results or [])}
+            results = [m for m in (cat_results or []) if m.get('idMeal') in reg_ids]
+
+        template_data['search_type'] = 'Category & Region'
+        template_data['search_term'] = f"{category} / {region}"
+        template_data['category_term'] = category
+        template_data['region_term'] = region
     else:
-        # No search => show random picks
-        template_data['recipes'] = fetch_random_recipes(8)
+        # Prefer category if provided, otherwise region
+        if category:
+            # Prefer category results if they exist; otherwise fall back to name search
+            if cat_results:
+                results = cat_results
+                template_data['search_type'] = 'Category'
+                template_data['search_term'] = category
+            else:
+                results = name_results
+                template_data['search_type'] = 'Name Search'
+                template_data['search_term'] = category
 
-    return render(request, 'recipes/index.html', {'template_data': template_data})
+            # Preserve both form fields appropriately
+            template_data['category_term'] = category
+            template_data['region_term'] = ''
+        else:
+            results = reg_results
+            template_data['search_type'] = 'Region'
+            template_data['search_term'] = region
+            template_data['region_term'] = region
+            template_data['category_term'] = ''
 
+    template_data['search_results'] = results
+    template_data['recipes'] = []
+    return template_data
 
+
+@conditional(etag_func=show_etag)
 def show(request, id):
-    url = f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={id}'
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        recipe = data.get('meals', [None])[0]
-    except Exception:
-        recipe = None
+    return render_show(request, id, catalog.get_meal(id))
+
 
+def render_show(request, id, recipe):
+    """Render a recipe page once its TheMealDB payload has been resolved."""
     # Extract ingredients and measures
-    ingredients = []
-    if recipe:
-        for i in range(1, 21):
-            ingredient = recipe.get(f'strIngredient{i}')
-            measure = recipe.get(f'strMeasure{i}')
-            if ingredient and ingredient.strip():
-                ingredients.append({
-                    'ingredient': ingredient.strip(),
-                    'measure': measure.strip() if measure else '',
-                })
-
-    # Get all ratings for this recipe
-    ratings = Rating.objects.filter(recipe_id=id).select_related('user')
-
-    # Calculate average rating
-    avg_rating = ratings.aggregate(Avg('rating'))['rating__avg']
-    avg_rating = round(avg_rating, 1) if avg_rating else None
-    avg_rating_int = int(round(avg_rating)) if avg_rating else 0
-    rating_count = ratings.count()
+    ingredients = catalog.parse_ingredients(recipe) if recipe else []
+
+    # The summary and reviews fragments are cached per recipe version; if
+    # both are cached (no rating written since) their queries are skipped
+    version = versions.recipe_version(id)
+    summary_fragment = versions.cached_fragment('recipe_summary', id, version)
+    reviews_fragment = versions.cached_fragment('recipe_reviews', id, version)
+    ratings, next_cursor = [], None
+    avg_rating, avg_rating_int, rating_count = None, 0, 0
+    if summary_fragment is None or reviews_fragment is None:
+        # First page of reviews; the rest is loaded from the reviews feed
+        ratings, next_cursor = reviews_page(id, limit=settings.REVIEWS_PAGE_SIZE)
+
+        # Average rating comes from the precomputed summary (one primary-key read)
+        summary = RatingSummary.objects.filter(recipe_id=id).first()
+        avg_rating = summary.average if summary else None
+        avg_rating_int = int(round(avg_rating)) if avg_rating else 0
+        rating_count = summary.count if summary else 0
 
     # Check if current user has already rated
     user_rating = None
@@ -212,7 +263,13 @@ def show(request, id):
         'recipe': recipe,
         'ingredients': ingredients,
         'instructions': recipe.get('strInstructions', '') if recipe else '',
+        'recipe_id': id,
+        'version': version,
+        'fragment_ttl': versions.fragment_ttl(),
+        'summary_fragment': summary_fragment,
+        'reviews_fragment': reviews_fragment,
         'ratings': ratings,
+        'next_cursor': next_cursor,
         'avg_rating': avg_rating,
         'avg_rating_int': avg_rating_int,
         'rating_count': rating_count,
@@ -224,6 +281,30 @@ def show(request, id):
     return render(request, 'recipes/show.html', {'template_data': template_data})
 
 
+@conditional(etag_func=reviews_etag, last_modified_func=reviews_last_modified)
+def reviews(request, id):
+    """JSON feed of a recipe's reviews, one keyset page per request."""
+    try:
+        page, next_cursor = reviews_page(id, request.GET.get('cursor'), settings.REVIEWS_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    return JsonResponse({
+        'reviews': [
+            {
+                'id': rating.id,
+                'username': rating.user.username,
+                'rating': rating.rating,
+                'comment': rating.comment,
+                'created_at': rating.created_at.isoformat(),
+                'updated_at': rating.updated_at.isoformat(),
+            }
+            for rating in page
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
 @login_required
 @require_POST
 def save_recipe(request, id):
@@ -231,67 +312,78 @@ def save_recipe(request, id):
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
 
-    # Fetch recipe details from API
-    url = f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={id}'
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        recipe = data.get('meals', [None])[0]
-    except Exception:
-        return JsonResponse({'error': 'Recipe not found'}, status=404)
-
-    if not recipe:
-        return JsonResponse({'error': 'Recipe not found'}, status=404)
-
-    # Use the recipe ID from the API (as string) to match SavedRecipe's CharField
-    recipe_id_str = recipe.get('idMeal', str(id))
-
-    # Check if already saved
-    saved_recipe, created = SavedRecipe.objects.get_or_create(
-        user=request.user,
-        recipe_id=recipe_id_str,
-        defaults={
-            'recipe_name': recipe.get('strMeal', ''),
-            'recipe_image': recipe.get('strMealThumb', ''),
-        }
-    )
-
-    if created:
-        return JsonResponse({'status': 'saved', 'message': 'Recipe saved successfully'})
-    else:
-        saved_recipe.delete()
-        return JsonResponse({'status': 'unsaved', 'message': 'Recipe removed from saved'})
+    # SavedRecipe.recipe_id is a CharField holding TheMealDB's idMeal
+    recipe_id_str = str(id)
+
+    with transaction.atomic():
+        # Already saved: unsave, the row is all that is needed
+        saved_recipe = SavedRecipe.objects.filter(user=request.user, recipe_id=recipe_id_str).first()
+        if saved_recipe:
+            saved_recipe.delete()
+            return JsonResponse({'status': 'unsaved', 'message': 'Recipe removed from saved'})
+
+        # Save with what is known locally (no API call on the request path)
+        recipe = catalog.local_meal(id)
+        if not recipe and catalog.known_missing(id):
+            return JsonResponse({'error': 'Recipe not found'}, status=404)
+        saved_recipe, _ = SavedRecipe.objects.get_or_create(
+            user=request.user,
+            recipe_id=recipe_id_str,
+            defaults={
+                'recipe_name': recipe.get('strMeal', '') if recipe else f'Recipe {id}',
+                'recipe_image': recipe.get('strMealThumb', '') if recipe else '',
+            }
+        )
+        if recipe:
+            # Keep the ingredients so the shopping list doesn't need the API
+            shopping.store_resolved([saved_recipe], {recipe_id_str: recipe})
+        else:
+            # Not mirrored yet: fetch name, image and ingredients in the background
+            shopping.enrich_later([saved_recipe.id])
+    return JsonResponse({'status': 'saved', 'message': 'Recipe saved successfully'})
 
 
 @login_required
+@conditional(etag_func=planner_etag, last_modified_func=planner_last_modified)
 def planner(request):
     """Weekly meal planner with kanban interface."""
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    meal_slots = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
+    days = [day for day, _ in WeeklyMealPlan.DAYS_OF_WEEK]
+    meal_slots = [meal_slot for meal_slot, _ in WeeklyMealPlan.MEAL_SLOTS]
+
+    template_data = {
+        'title': 'Weekly Meal Planner',
+        'days': days,
+        'meal_slots': meal_slots,
+        'version': versions.user_version(request.user.id),
+        'fragment_ttl': versions.fragment_ttl(),
+    }
+
+    # The board is cached per user data version: nothing to query if the
+    # user has not changed their planner or saved recipes since
+    template_data['board_fragment'] = versions.cached_fragment('planner', request.user.id, template_data['version'])
+    if template_data['board_fragment'] is not None:
+        return render(request, 'recipes/planner.html', {'template_data': template_data})
 
     # Get saved recipes for the user
     saved_recipes = SavedRecipe.objects.filter(user=request.user)
 
-    # Get meal plans grouped by day and meal slot
-    meal_plans = WeeklyMealPlan.objects.filter(user=request.user).select_related('saved_recipe')
+    # Get meal plans (oldest first within a slot)
+    meal_plans = (WeeklyMealPlan.objects.filter(user=request.user)
+                  .select_related('saved_recipe').order_by('created_at', 'id'))
 
-    # Organize meal plans by day and meal slot
-    planner_data = {}
-    for day in days:
-        planner_data[day] = {}
-        for meal_slot in meal_slots:
-            planner_data[day][meal_slot] = [
-                plan for plan in meal_plans
-                if plan.day == day and plan.meal_slot == meal_slot
-            ]
+    # Organize meal plans by day and meal slot in a single pass
+    planner_data = {day: {meal_slot: [] for meal_slot in meal_slots} for day in days}
+    for plan in meal_plans:
+        planner_data[plan.day][plan.meal_slot].append(plan)
 
-    template_data = {
-        'title': 'Weekly Meal Planner',
-        'days': days,
-        'meal_slots': meal_slots,
+    # Rows the template can iterate directly: [(day, [(meal_slot, plans), ...]), ...]
+    planner_grid = [(day, list(planner_data[day].items())) for day in days]
+
+    template_data.update({
         'saved_recipes': saved_recipes,
         'planner_data': planner_data,
-    }
+        'planner_grid': planner_grid,
+    })
     return render(request, 'recipes/planner.html', {'template_data': template_data})
 
 
@@ -336,6 +428,7 @@ def add_to_planner(request):
         'meal_plan_id': meal_plan.id,
         'recipe_name': saved_recipe.recipe_name,
         'recipe_image': saved_recipe.recipe_image,
+        'recipe_thumb': thumbnails.thumb_url(saved_recipe.recipe_id, 'small', saved_recipe.recipe_image),
     })
 
 
@@ -352,36 +445,85 @@ def remove_from_planner(request, meal_plan_id):
 
 
 @login_required
-def shopping_list(request):
-    """Shopping list page that aggregates ingredients from saved recipes."""
-    # Get all saved recipes for the user
-    saved_recipes = SavedRecipe.objects.filter(user=request.user)
+@require_POST
+def planner_batch(request):
+    """Apply a list of planner operations in one request and one transaction.
 
-    # Aggregate unique ingredients from all saved recipes
-    all_ingredients = set()
-    ingredients_by_recipe = {}
+    Expects a JSON body ``{"operations": [...]}``; see recipes.planner for
+    the supported operations (add, move, remove, copy_day, clear_day,
+    clear_week).
+    """
+    try:
+        operations = json.loads(request.body or b'{}').get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
 
-    for saved_recipe in saved_recipes:
-        # Fetch recipe details from API
-        url = f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={saved_recipe.recipe_id}'
-        try:
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            recipe = data.get('meals', [None])[0]
-
-            if recipe:
-                recipe_ingredients = []
-                for i in range(1, 21):
-                    ingredient = recipe.get(f'strIngredient{i}')
-                    if ingredient and ingredient.strip():
-                        ingredient_name = ingredient.strip()
-                        all_ingredients.add(ingredient_name)
-                        recipe_ingredients.append(ingredient_name)
-
-                if recipe_ingredients:
-                    ingredients_by_recipe[saved_recipe.recipe_name] = recipe_ingredients
-        except Exception:
-            continue
+    try:
+        created, moved, removed = apply_operations(request.user, operations)
+    except PlannerOperationError as exc:
+        return JsonResponse({'error': str(exc), 'operation': exc.index}, status=400)
+
+    saved_recipes = SavedRecipe.objects.in_bulk({plan.saved_recipe_id for plan in created})
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Planner updated',
+        'created': [
+            {
+                'meal_plan_id': plan.id,
+                'saved_recipe_id': plan.saved_recipe_id,
+                'day': plan.day,
+                'meal_slot': plan.meal_slot,
+                'recipe_name': saved_recipes[plan.saved_recipe_id].recipe_name,
+                'recipe_image': saved_recipes[plan.saved_recipe_id].recipe_image,
+            }
+            for plan in created
+        ],
+        'moved': moved,
+        'removed': removed,
+    })
+
+
+@login_required
+@conditional(etag_func=shopping_list_etag, last_modified_func=shopping_list_last_modified)
+def shopping_list(request):
+    """Shopping list page that aggregates ingredients from saved recipes."""
+    # Nothing written since the list was cached (without unavailable
+    # recipes to retry): serve it without touching the database
+    fragment = versions.cached_fragment('shopping_list', request.user.id, versions.user_version(request.user.id), 0)
+    if fragment is not None:
+        return render_shopping_list(request, [], fragment)
+
+    # Recipes saved before their ingredients were stored get them resolved
+    # once, in one batch (local catalog first, then concurrent API lookups
+    # bounded by the page deadline)
+    pending = list(SavedRecipe.objects.filter(user=request.user, ingredients_synced=False))
+    unavailable_recipes = []
+    if pending:
+        recipes, _ = catalog.get_meals([saved_recipe.recipe_id for saved_recipe in pending])
+        unavailable_recipes = shopping.store_resolved(pending, recipes)
+    return render_shopping_list(request, unavailable_recipes)
+
+
+def render_shopping_list(request, unavailable_recipes, fragment=None):
+    """Render the shopping list from the stored ingredients of saved
+    recipes, or with the given cached markup of the list."""
+    template_data = {
+        'title': 'Shopping List',
+        'version': versions.user_version(request.user.id),
+        'fragment_ttl': versions.fragment_ttl(),
+        'unavailable_recipes': unavailable_recipes,
+    }
+    if fragment is None:
+        fragment = versions.cached_fragment('shopping_list', request.user.id, template_data['version'],
+                                            len(unavailable_recipes))
+    template_data['list_fragment'] = fragment
+    if fragment is not None:
+        return render(request, 'recipes/shopping_list.html', {'template_data': template_data})
+
+    # Unique ingredients of all saved recipes, kept aggregated on save and
+    # unsave, and the per-recipe breakdown (one query each)
+    all_ingredients = shopping.ingredient_names(request.user)
+    ingredients_by_recipe = shopping.ingredients_by_recipe(request.user)
 
     # Get existing shopping items
     shopping_items = ShoppingItem.objects.filter(user=request.user)
@@ -396,14 +538,13 @@ def shopping_list(request):
     # Get custom shopping items (not from recipes) with IDs
     custom_items = sorted([(item.name, item.id) for item in shopping_items if item.name not in all_ingredients], key=lambda x: x[0])
 
-    template_data = {
-        'title': 'Shopping List',
+    template_data.update({
         'recipe_ingredients_not_in_list': recipe_ingredients_not_in_list,
         'recipe_ingredients_in_list': recipe_ingredients_in_list,
         'custom_items': custom_items,
         'all_shopping_items': shopping_items,
         'ingredients_by_recipe': ingredients_by_recipe,
-    }
+    })
     return render(request, 'recipes/shopping_list.html', {'template_data': template_data})
 
 
@@ -465,4 +606,71 @@ def map_view(request):
         'title': 'Find Grocery Stores',
         'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY,
     }
-    return render(request, 'recipes/map.html', {'template_data': template_data})
\ No newline at end of file
+    return render(request, 'recipes/map.html', {'template_data': template_data})
+
+
+def thumbnail(request, id, size):
+    """Serve a recipe image resized to one of THUMBNAIL_SIZES.
+
+    The image behind a URL never changes, so it may be cached forever
+    (unless it is the unresized original). If it can't be served the
+    browser is sent to the upstream image (the signed ``src``, see
+    ``thumbnails.thumb_url``).
+    """
+    if size not in settings.THUMBNAIL_SIZES:
+        raise Http404('Unknown thumbnail size')
+    src = thumbnails.source(request.GET.get('src'))
+    try:
+        found = thumbnails.get_thumbnail(id, size, src)
+    except Exception:
+        found = None
+    if found is None:
+        url = thumbnails.upstream_url(id, src)
+        if url:
+            return redirect(url)
+        raise Http404('Recipe image not found')
+
+    path, digest, resized = found
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'))
+    response['ETag'] = etag
+    if resized:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.THUMBNAIL_ORIGINAL_MAX_AGE}'
+    return response
+
+
+@login_required
+def cook_with(request):
+    """JSON list of recipes ranked by how many of their ingredients the user
+    has: the comma-separated ``ingredients`` parameter, or else the user's
+    shopping list."""
+    if 'ingredients' in request.GET:
+        ingredients = [name for name in request.GET['ingredients'].split(',') if name.strip()]
+    else:
+        ingredients = list(ShoppingItem.objects.filter(user=request.user).values_list('name', flat=True))
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+
+    recipes, unknown = pantry.get_index().match(ingredients, limit)
+    return JsonResponse({
+        'ingredients': ingredients,
+        'unknown': unknown,
+        'recipes': recipes,
+    })
+
+
+@login_required
+def cache_stats(request):
+    """Hit/miss/eviction counters of the recipe lookup cache and the state
+    of the random recipe pool (staff only)."""
+    if not (request.user.is_staff or request.user.is_superuser):
+        raise PermissionDenied("You do not have permission to access this page.")
+    return JsonResponse({'recipe_cache': recipe_cache.stats(), 'random_pool': random_pool.stats()})
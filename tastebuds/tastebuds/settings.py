@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipes.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +65,8 @@ ROOT_URLCONF = 'tastebuds.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render times reported to recipes.metrics
+        'BACKEND': 'recipes.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR,
                               'tastebuds/templates')],
         'APP_DIRS': True,
@@ -84,12 +86,54 @@ WSGI_APPLICATION = 'tastebuds.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; set DB_ENGINE (e.g. django.db.backends.postgresql) and
+# DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT to use a database server.
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+                # Take the write lock when the transaction starts, so waiting
+                # writers queue on the busy timeout instead of failing when a
+                # read transaction tries to upgrade
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers run alongside the writer; NORMAL sync is
+                # safe in WAL mode and skips an fsync per commit
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            # A file (not in-memory) test database, so tests see WAL and
+            # real cross-connection locking
+            'TEST': {
+                'NAME': os.getenv('DB_TEST_NAME', BASE_DIR / 'test_db.sqlite3'),
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', 'tastebuds'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+        }
+    }
+
+# Keep connections open between requests, checking they are still usable
+# before reuse
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
 
 # Password validation
@@ -137,4 +181,84 @@ STATICFILES_DIRS = [
 ]
 
 # Google Maps API Key
-GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
\ No newline at end of file
+GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
+# TheMealDB client (recipes.mealdb)
+MEALDB_BASE_URL = os.getenv('MEALDB_BASE_URL', 'https://www.themealdb.com/api/json/v1/1/')
+MEALDB_POOL_SIZE = int(os.getenv('MEALDB_POOL_SIZE', '20'))
+MEALDB_CONNECT_TIMEOUT = float(os.getenv('MEALDB_CONNECT_TIMEOUT', '3.05'))
+MEALDB_READ_TIMEOUT = float(os.getenv('MEALDB_READ_TIMEOUT', '10'))
+# Upper bound on concurrent upstream calls and the landing page's budget for random.php
+MEALDB_MAX_WORKERS = int(os.getenv('MEALDB_MAX_WORKERS', '16'))
+# Threads for background refreshes and enrichment, apart from the request-path pool
+MEALDB_BACKGROUND_WORKERS = int(os.getenv('MEALDB_BACKGROUND_WORKERS', '4'))
+MEALDB_RANDOM_DEADLINE = float(os.getenv('MEALDB_RANDOM_DEADLINE', '3'))
+MEALDB_PAGE_DEADLINE = float(os.getenv('MEALDB_PAGE_DEADLINE', '5'))
+
+# Shared cache (recipe payloads, fragment versions, dashboard stats). The
+# default is per-process; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached when running several worker processes.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))}
+
+# Planner/shopping list/recipe fragments (recipes.versions), in seconds
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', str(60 * 60 * 24)))
+# Fragments, API data and ETags are keyed on data versions, which a
+# per-process cache can't share between worker processes, so they are off
+# unless the cache is shared. VERSIONED_CACHING=1 turns them on regardless
+# (e.g. when serving from a single process).
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+VERSIONED_CACHING = os.getenv('VERSIONED_CACHING', '0' if CACHE_BACKEND in PER_PROCESS_CACHES else '1') == '1'
+
+# Recipe lookup cache (recipes.cache): in-process LRU size and TTLs in seconds
+RECIPE_CACHE_SIZE = int(os.getenv('RECIPE_CACHE_SIZE', '1024'))
+RECIPE_CACHE_TTL = int(os.getenv('RECIPE_CACHE_TTL', str(60 * 60 * 24)))
+RECIPE_CACHE_STALE_TTL = int(os.getenv('RECIPE_CACHE_STALE_TTL', str(60 * 60 * 24 * 6)))
+RECIPE_CACHE_NEGATIVE_TTL = int(os.getenv('RECIPE_CACHE_NEGATIVE_TTL', '300'))
+
+# Route index/show/shopping_list to their async versions (for ASGI deployments)
+RECIPES_ASYNC_VIEWS = os.getenv('RECIPES_ASYNC_VIEWS', '') == '1'
+
+# Reviews rendered with a recipe page; more are loaded from recipes.reviews
+REVIEWS_PAGE_SIZE = int(os.getenv('REVIEWS_PAGE_SIZE', '10'))
+
+# Admin dashboard: how long the user counts are cached, and users per page
+ADMIN_STATS_CACHE_TTL = int(os.getenv('ADMIN_STATS_CACHE_TTL', '30'))
+ADMIN_USERS_PAGE_SIZE = int(os.getenv('ADMIN_USERS_PAGE_SIZE', '25'))
+
+# Random recipes for the landing page (recipes.random_pool): pool size,
+# seconds between background redraws, and random.php calls per redraw
+# while the local catalog is smaller than the pool
+RANDOM_POOL_SIZE = int(os.getenv('RANDOM_POOL_SIZE', '300'))
+RANDOM_POOL_REFRESH_INTERVAL = int(os.getenv('RANDOM_POOL_REFRESH_INTERVAL', '900'))
+RANDOM_POOL_UPSTREAM_BATCH = int(os.getenv('RANDOM_POOL_UPSTREAM_BATCH', '32'))
+
+# "Cook with what I have" (recipes.pantry): at most this often (seconds) a
+# query checks for recipes stored by other processes, e.g. sync_mealdb
+PANTRY_INDEX_REFRESH_INTERVAL = int(os.getenv('PANTRY_INDEX_REFRESH_INTERVAL', '60'))
+
+# Resized recipe images (recipes.thumbnails): where they are stored, the
+# width in pixels of each size, JPEG quality, the largest image fetched, and
+# how long browsers keep an original served unresized (without Pillow)
+THUMBNAIL_ROOT = os.getenv('THUMBNAIL_ROOT', BASE_DIR / 'thumbnails')
+THUMBNAIL_SIZES = {'small': 160, 'medium': 360, 'large': 720}
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '82'))
+THUMBNAIL_MAX_BYTES = int(os.getenv('THUMBNAIL_MAX_BYTES', str(5 * 1024 * 1024)))
+THUMBNAIL_ORIGINAL_MAX_AGE = int(os.getenv('THUMBNAIL_ORIGINAL_MAX_AGE', '3600'))
+
+# JSON API (recipes.api): default and largest page size of list endpoints
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '200'))
+
+# Request instrumentation (recipes.metrics): fraction of requests timed
+# (0 turns it off), and client addresses allowed to read /metrics and the
+# Server-Timing header besides staff. Clear METRICS_ALLOWED_IPS when behind a
+# reverse proxy on the same host, where every client appears local.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1.0'))
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from recipes import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('home.urls')),
     path('recipes/', include('recipes.urls')),
     path('accounts/', include('accounts.urls')),
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]